@@ -5,14 +5,14 @@ from models.auto_cnn import CNN
 from models.autoencoder import Autoencoder
 
 
-def AutoGreedyAgent(epochs=30, initial_epochs=None):
+def AutoGreedyAgent(epochs=30, initial_epochs=None, steps=None, replay=0.5, tol=None):
     '''Constructs agent with weighted autoencoder to predict sequence values that trains with each observation.
     Greedily selects sequences with best predicions.
     '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -26,7 +26,7 @@ def AutoGreedyAgent(epochs=30, initial_epochs=None):
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs) 
+            self.train(self.model, data)
         
     return Agent
 
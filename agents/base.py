@@ -6,6 +6,13 @@ import environment.featurize
 class BaseAgent:
     '''Template for agent classes.'''
 
+    ids = False # act takes and returns arrays of integer sequence IDs (rows of encode) instead of sequences
+
+    def __init_subclass__(cls, **kwargs):
+        '''Subclasses must opt in to integer IDs themselves, since they may override act.'''
+        super().__init_subclass__(**kwargs)
+        cls.ids = cls.__dict__.get('ids', False)
+
     def __init__(self, prior, shape, batch, encode):
         self.seen = {}
         self.prior = prior
@@ -6,7 +6,7 @@ from models.auto_cnn import CNN
 import utils.mcmc
 
 
-def BucketAgent(epochs=30, initial_epochs=None, dim=5, k=1., prior=(0.5, 10, 1, 1), eps=0., rho=0.):
+def BucketAgent(epochs=30, initial_epochs=None, dim=5, k=1., prior=(0.5, 10, 1, 1), eps=0., rho=0., steps=None, replay=0.5, tol=None):
     '''Constructs agent that buckets sequences with autoencoder embedding, then
     uses Thompson sampling to select between buckets in batches.
     dim: embedding shape
@@ -19,7 +19,9 @@ def BucketAgent(epochs=30, initial_epochs=None, dim=5, k=1., prior=(0.5, 10, 1,
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
+
+        ids = True
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -32,6 +34,6 @@ def BucketAgent(epochs=30, initial_epochs=None, dim=5, k=1., prior=(0.5, 10, 1,
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.model, data)
         
     return Agent
@@ -6,7 +6,7 @@ from models.auto_cnn import CNN
 import utils.mcmc
 
 
-def CombinatorialAgent(epochs=30, dim=5, k=1., prior=(0.5, 10, 1, 1), eps=0., rho=1.0):
+def CombinatorialAgent(epochs=30, dim=5, k=1., prior=(0.5, 10, 1, 1), eps=0., rho=1.0, steps=None, replay=0.5, tol=None):
     '''Constructs agent that buckets sequences with autoencoder embedding, then
     uses MCMC to approximate Thompson sampling over all possible distributions 
     of buckets to sample to maximize a metric which evaluates a portion of
@@ -20,7 +20,9 @@ def CombinatorialAgent(epochs=30, dim=5, k=1., prior=(0.5, 10, 1, 1), eps=0., rh
     rho: top portion of batch on which to maximize score (should correspond to metric parameter)
     '''
 
-    class Agent(agents.random.RandomAgent(epochs)):
+    class Agent(agents.random.RandomAgent(epochs, steps=steps, replay=replay, tol=tol)):
+
+        ids = True
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -31,6 +33,6 @@ def CombinatorialAgent(epochs=30, dim=5, k=1., prior=(0.5, 10, 1, 1), eps=0., rh
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.model, data)
         
     return Agent
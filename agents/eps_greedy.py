@@ -4,14 +4,14 @@ import agents.random
 from models.auto_cnn import CNN
 
 
-def EpsilonGreedyAgent(epochs=30, initial_epochs=None, eps=0.1):
+def EpsilonGreedyAgent(epochs=30, initial_epochs=None, eps=0.1, steps=None, replay=0.5, tol=None):
     '''Constructs agent with CNN to predict sequence values that trains with each observation.
     Greedily selects sequences with best predicions. Act randomly with probability eps.
     '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -28,6 +28,6 @@ def EpsilonGreedyAgent(epochs=30, initial_epochs=None, eps=0.1):
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.model, data)
         
     return Agent
@@ -8,17 +8,18 @@ import torch
 from torch.distributions.multivariate_normal import MultivariateNormal
 
 
-def FittedGaussianAgent(epochs=30, initial_epochs=None, dim=5, beta=1., mb=10):
+def FittedGaussianAgent(epochs=30, initial_epochs=None, dim=5, beta=1., mb=10, steps=None, replay=0.5, tol=None):
     '''Constructs agent that uses batch version of GP-UCB algorithm to sample
     sequences with a fitted GPyTorch regression.
     dim: embedding dimension.
     beta: squared scaling of uncertainty for ucb.
     mb: actions selected before refitting GP.
+    steps, replay, tol: as for RandomAgent, but only for the embedding net (the GP is refit on all observations)
     '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -52,17 +53,19 @@ def FittedGaussianAgent(epochs=30, initial_epochs=None, dim=5, beta=1., mb=10):
 
         def observe(self, data):
             super().observe(data)
-            self.embed.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.embed, data)
         
     return Agent
 
 
-def ThompsonGPAgent(epochs=30, initial_epochs=None, dim=5):
-    '''Agent using batch GP Thompson sampling.'''
+def ThompsonGPAgent(epochs=30, initial_epochs=None, dim=5, steps=None, replay=0.5, tol=None):
+    '''Agent using batch GP Thompson sampling.
+    steps, replay, tol: as for RandomAgent, but only for the embedding net (the GP is refit on all observations)
+    '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -92,7 +95,7 @@ def ThompsonGPAgent(epochs=30, initial_epochs=None, dim=5):
 
         def observe(self, data):
             super().observe(data)
-            self.embed.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.embed, data)
         
     return Agent
 
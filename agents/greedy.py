@@ -4,14 +4,16 @@ import agents.random
 from models.auto_cnn import CNN
 
 
-def GreedyAgent(epochs=30, initial_epochs=None):
+def GreedyAgent(epochs=30, initial_epochs=None, steps=None, replay=0.5, tol=None):
     '''Constructs agent with CNN to predict sequence values that trains with each observation.
     Greedily selects sequences with best predicions.
     '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
+
+        ids = True
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -20,10 +22,12 @@ def GreedyAgent(epochs=30, initial_epochs=None):
                 self.model.fit(*zip(*self.prior.items()), epochs=initial_epochs)
         
         def act(self, seqs):
+            if isinstance(seqs, np.ndarray):
+                return seqs[np.argsort(self.model.predict(seqs), kind='stable')[-self.batch:]]
             return list(zip(*sorted(zip(self.model.predict(seqs), seqs))[-self.batch:]))[1]
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.model, data)
         
     return Agent
@@ -7,7 +7,7 @@ from torch.distributions import Normal
 from torch import tensor
 
 
-def PseudoThompsonAgent(epochs=30, initial_epochs=None):
+def PseudoThompsonAgent(epochs=30, initial_epochs=None, steps=None, replay=0.5, tol=None):
     '''Constructs agent with a CNN trained to predict gaussians with uncertainty, 
     using Thompson sampling with the network's uncertainty to select batches, and 
     fitting the model to update the predicted distributions between batches.
@@ -15,7 +15,7 @@ def PseudoThompsonAgent(epochs=30, initial_epochs=None):
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -30,6 +30,6 @@ def PseudoThompsonAgent(epochs=30, initial_epochs=None):
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.model, data)
         
     return Agent
@@ -1,26 +1,42 @@
 import numpy as np
 from random import *
 import agents.base
+import utils.model
 from models.auto_cnn import CNN
 
 
-def RandomAgent(epochs=30, initial_epochs=None):
+def RandomAgent(epochs=30, initial_epochs=None, steps=None, replay=0.5, tol=None):
     '''Constructs agent that uses CNN to predict sequence values.
-    Randomly selects new sequences to observe.
+    Randomly selects new sequences to observe. Agents built on it train their
+    models on each observation with train.
+    steps: train for this many minibatches of new and replayed earlier observations per
+        observe instead of retraining on all of them (see utils.model.Schedule)
+    replay: portion of each minibatch replayed from earlier observations
+    tol: relative loss change at which to stop training early
     '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
     class Agent(agents.base.BaseAgent):
 
+        ids = True
+
         def __init__(self, *args):
             super().__init__(*args)
         
         def act(self, seqs):
+            if isinstance(seqs, np.ndarray):
+                return seqs[sample(range(len(seqs)), self.batch)]
             return sample(seqs, self.batch)
 
         def observe(self, data):
             super().observe(data)
+
+        def train(self, model, data):
+            '''Fit model to the seen sequences after observing data, for epochs or
+            incrementally with steps, replay and tol.
+            '''
+            model.fit(*zip(*self.seen.items()), epochs=epochs, **utils.model.incremental(data, steps, replay, tol))
         
         def predict(self, seqs):
             result = np.zeros([len(seqs)])
@@ -6,18 +6,20 @@ from models.auto_cnn import CNN
 from agents.gaussian import GaussianAgent
 
 
-def SmartGaussianAgent(epochs=30, initial_epochs=None, dim=5, tau=0.01, beta=0.02):
+def SmartGaussianAgent(epochs=30, initial_epochs=None, dim=5, tau=0.01, beta=0.02, steps=None, replay=0.5, tol=None):
     '''Constructs agent that uses batch version of GP-UCB algorithm to sample
     sequences with a deep kernel gaussian process regression.
     dim: embedding dimension. Uses autoencoder predictions instead of gaussian
     regression for computing predicted mu values.
     tau: kernel covariance parameter.
     beta: relative weight of sequence score in generating embedding.
+    steps, replay, tol: as for RandomAgent, but only for the embedding net (the GP is refit on all observations)
     '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.gaussian.GaussianAgent(epochs, initial_epochs, dim, tau, beta)):
+    class Agent(agents.gaussian.GaussianAgent(epochs, initial_epochs, dim, tau, beta,
+                                                   steps=steps, replay=replay, tol=tol)):
 
         def act(self, seqs):
             prior = {}
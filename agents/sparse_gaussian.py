@@ -6,18 +6,19 @@ from models.auto_cnn import CNN
 import utils.mcmc
 
 
-def SparseGaussianAgent(epochs=30, initial_epochs=None, dim=5, beta=0.02, k=1., M=1000):
+def SparseGaussianAgent(epochs=30, initial_epochs=None, dim=5, beta=0.02, k=1., M=1000, steps=None, replay=0.5, tol=None):
     '''Constructs agent that uses batch version of GP-UCB algorithm to sample
     sequences with a deep kernel sparse gaussian process regression.
     dim: embedding dimension.
     beta: relative weight of sequence score in generating embedding.
     k: scaling of batch by which to oversample, and then find representative
         maximally-separated subset with mcmc.
+    steps, replay, tol: as for RandomAgent, but only for the embedding net (the GP is refit on all observations)
     '''
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -44,6 +45,6 @@ def SparseGaussianAgent(epochs=30, initial_epochs=None, dim=5, beta=0.02, k=1.,
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs) 
+            self.train(self.model, data)
         
     return Agent
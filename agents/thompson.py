@@ -5,7 +5,7 @@ from models.auto_cnn import CNN
 import agents.random
 
 
-def ThompsonAgent(epochs=30, initial_epochs=None):
+def ThompsonAgent(epochs=30, initial_epochs=None, steps=None, replay=0.5, tol=None):
     '''Constructs agent with a Bayesian CNN, using Thompson sampling with the
     network's uncertainty (over its parameters) to select batches, and 
     fitting the model to update the predicted distributions between batches.
@@ -13,7 +13,7 @@ def ThompsonAgent(epochs=30, initial_epochs=None):
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -27,6 +27,6 @@ def ThompsonAgent(epochs=30, initial_epochs=None):
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.model, data)
         
     return Agent
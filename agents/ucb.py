@@ -5,7 +5,7 @@ from models.auto_cnn import CNN
 import agents.base
 
 
-def UCBAgent(epochs=30, initial_epochs=None):
+def UCBAgent(epochs=30, initial_epochs=None, steps=None, replay=0.5, tol=None):
     '''Constructs agent with a Bayesian CNN, using Thompson sampling with the
     network's uncertainty (over its parameters) to select the highest UCB
     sequences to test in terms of (mu + sigma), and fits the model
@@ -14,7 +14,7 @@ def UCBAgent(epochs=30, initial_epochs=None):
     if initial_epochs is None:
         initial_epochs = epochs // 4
 
-    class Agent(agents.random.RandomAgent(epochs, initial_epochs)):
+    class Agent(agents.random.RandomAgent(epochs, initial_epochs, steps, replay, tol)):
 
         def __init__(self, *args):
             super().__init__(*args)
@@ -29,6 +29,6 @@ def UCBAgent(epochs=30, initial_epochs=None):
 
         def observe(self, data):
             super().observe(data)
-            self.model.fit(*zip(*self.seen.items()), epochs=epochs)
+            self.train(self.model, data)
         
     return Agent
@@ -1,27 +1,32 @@
-import os
-import sys
 import json
 import signal
 import argparse
-import subprocess
 import multiprocessing
 import pkg_resources
 
 dependencies = [x.strip() for x in open('requirements.txt')]
 pkg_resources.require(dependencies)
+import run
+import utils.threads
 signal.signal(signal.SIGINT, lambda x, y: exit(1))
-dir_path = os.path.dirname(os.path.realpath(__file__))
 parser = argparse.ArgumentParser()
 parser.add_argument('file', type=str, help='JSON file with jobs to run')
-parser.add_argument('-n', type=int, default=None, help='number of jobs to run simultaneously')
+parser.add_argument('-n', type=int, default=multiprocessing.cpu_count(), help='number of cores to split between all runs')
+parser.add_argument('--threads', type=int, default=None, help='threads per run (default chosen by agent types)')
+parser.add_argument('--affinity', action='store_true', help='pin each run to its own cores')
+parser.add_argument('--warm', action='store_true', help='reuse worker processes across runs')
 args = parser.parse_args()
 jobs = json.loads(open(args.file).read())
 
-def run_job(job):
+def job_args(job):
+    '''Return run.py arguments for job.'''
     print(f'{job}')
+    shared = [arg for arg in ['cpus', 'threads', 'affinity', 'warm', 'calibrate'] if arg in job]
+    if shared:
+        parser.error(f'{", ".join(shared)} apply to the whole batch: pass -n, --threads, --affinity or --warm to batch.py instead')
+
+    args = []
 
-    args = [sys.executable, f'{dir_path}/run.py']
-    
     def val_arg(arg):
         nonlocal args
         if arg in job:
@@ -37,14 +42,34 @@ def run_job(job):
         if arg in job:
             args += [f'--{arg}', *map(str, job[arg])]
 
-    for arg in ['agents', 'metrics']:
+    for arg in ['agents', 'metrics', 'tracemalloc']:
         multi_arg(arg)
 
-    for arg in ['batch', 'cutoff', 'pretrain', 'validation', 'env', 'reps', 'name', 'cpus', 'timeout', 'seed']:
+    for arg in ['batch', 'cutoff', 'pretrain', 'validation', 'env', 'reps', 'name', 'timeout', 'budget', 'seed', 'cache', 'checkpoint', 'profile', 'profiler', 'backend', 'precision', 'compile-cache', 'inference-memory']:
         val_arg(arg)
 
-    subprocess.run(args, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+    for arg in ['shared-cache', 'resume', 'events']:
+        bool_arg(arg)
+
+    return run.make_parser().parse_args(args)
 
-pool = multiprocessing.Pool(processes=args.n, maxtasksperchild=1)
-pool.map(run_job, jobs, chunksize=1)
+# Expand jobs into (environment, agent, rep) runs, building each distinct environment once.
+# Jobs sharing an environment share its validation split, drawn with the first one's seed.
+envs = {}
+runs = []
+for job in map(job_args, jobs):
+    loc, seed = run.setup(job)
+    key = (job.env, job.batch, job.validation, job.pretrain, job.cache, job.shared_cache)
+    if key not in envs:
+        envs[key] = run.make_env(job)
+    runs.append((job, loc, run.make_tasks(envs[key], job, loc, seed)))
 
+# Run everything on one pool splitting the core budget
+agents = [agent for job, loc, tasks in runs for agent in job.agents]
+threads = args.threads if args.threads is not None else utils.threads.heuristic(agents)
+partition = utils.threads.Partition(args.n, threads, sum(len(tasks) for job, loc, tasks in runs), args.affinity)
+pool = run.make_pool(agents, partition, args.warm)
+results = [(job, loc, tasks, run.submit(pool, tasks)) for job, loc, tasks in runs]
+for job, loc, tasks, done in results:
+    run.write_output(run.collect(done, tasks), job, loc)
+pool.close()
@@ -0,0 +1,70 @@
+import multiprocessing
+import platform
+import json
+import time
+import os
+import numpy as np
+import torch
+
+
+def machine():
+    '''Return description of this machine and library versions for baselines.'''
+    return dict(host=platform.node(), platform=platform.platform(), processor=platform.processor(),
+                cpus=multiprocessing.cpu_count(), threads=torch.get_num_threads(), python=platform.python_version(),
+                numpy=np.__version__, torch=torch.__version__, cuda=torch.cuda.is_available())
+
+
+def measure(f, repeat=5, warmup=1, min_time=0.):
+    '''Time f, a function of no arguments, returning the min, median and max
+    seconds per call over repeat calls after warmup untimed calls. Calls
+    are repeated until they take at least min_time seconds in total.
+    '''
+    for _ in range(warmup):
+        f()
+    times = []
+    while len(times) < repeat or sum(times) < min_time:
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return dict(min=min(times), median=float(np.median(times)), max=max(times), repeat=len(times))
+
+
+def dna(n, length=20, rng=None):
+    '''Return n random DNA sequences [+-][ATCG]{length}.'''
+    rng = np.random.RandomState(0) if rng is None else rng
+    bases = np.array(list('ATCG'))[rng.randint(4, size=[n, length])]
+    strands = np.array(list('+-'))[rng.randint(2, size=[n, 1])]
+    return [''.join(x) for x in np.concatenate([strands, bases], axis=1)]
+
+
+def save(path, data):
+    '''Write data as JSON to path, creating its directory.'''
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.1, key='min'):
+    '''Return (name, baseline seconds, current seconds, ratio) for the benchmarks
+    in both result dictionaries, and the names of those slower by more than
+    threshold (as a fraction of the baseline time).
+    '''
+    rows = [(name, baseline[name][key], current[name][key], current[name][key] / max(baseline[name][key], 1e-12))
+            for name in current if name in baseline]
+    return rows, [name for name, old, new, ratio in rows if ratio > 1 + threshold]
+
+
+def report(rows, slower, threshold):
+    '''Print comparison rows from compare, marking slowdowns beyond threshold.'''
+    width = max([len(name) for name, *_ in rows] + [9])
+    print(f'{"benchmark":<{width}} {"baseline":>10} {"current":>10} {"ratio":>7}')
+    for name, old, new, ratio in rows:
+        flag = '  SLOWER' if name in slower else '  faster' if ratio < 1 / (1 + threshold) else ''
+        print(f'{name:<{width}} {old:>10.4g} {new:>10.4g} {ratio:>7.2f}{flag}')
+    print(f'{len(slower)} of {len(rows)} benchmarks slower by more than {threshold:.0%}')
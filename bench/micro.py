@@ -0,0 +1,259 @@
+import argparse
+import random
+import sys
+import re
+import numpy as np
+import torch
+import bench.common
+import environment.cache
+import environment.featurize
+import environment.metrics
+import utils.engine
+import utils.threads
+
+BENCHMARKS = {} # name to (setup function, sizes)
+METRICS = ['Regret(0.2)', 'Score(0.2)', 'Discovery(0.2)', 'Time()', 'Improvement()', 'Phase("fit")']
+
+
+def benchmark(*sizes, name=None):
+    '''Register the decorated setup function, which takes a size n and returns
+    a function of no arguments to time, to run at each of sizes.
+    '''
+    def register(setup):
+        BENCHMARKS[name or setup.__name__] = (setup, sizes)
+        return setup
+    return register
+
+
+def _seed():
+    random.seed(0)
+    np.random.seed(0)
+    torch.manual_seed(0)
+
+
+def _uncached():
+    return environment.cache.EncodingCache(0, np.uint8)
+
+
+def _featurizer(n, epochs=1):
+    '''Return Featurizer fit to n random labeled 20-mers, and the sequences.'''
+    from models.featurizer import Featurizer
+    _seed()
+    seqs = bench.common.dna(n)
+    encoder = environment.featurize.SeqEncoder(20, cache=_uncached())
+    model = Featurizer(encoder, encoder.shape, dim=5)
+    model.fit(seqs, np.random.random_sample(n), epochs)
+    return model, seqs
+
+
+@benchmark(1000, 10000, 100000)
+def encode_seq(n):
+    seqs = bench.common.dna(n)
+    encoder = environment.featurize.SeqEncoder(20, cache=_uncached())
+    return lambda: encoder.batch(seqs)
+
+
+@benchmark(1000, 10000)
+def encode_rich(n):
+    seqs = bench.common.dna(n)
+    encoder = environment.featurize.RichSeqEncoder(20, cache=_uncached())
+    return lambda: encoder.batch(seqs)
+
+
+@benchmark(1000, 10000)
+def encode_protein(n):
+    aa = environment.featurize.ProteinEncoder.aa
+    rng = np.random.RandomState(0)
+    base = [aa[i] for i in rng.randint(len(aa), size=100)]
+    deltas = []
+    for _ in range(n):
+        pos = rng.choice(len(base), size=rng.randint(1, 4), replace=False)
+        deltas.append('p.[' + ';'.join(f'{base[i]}{i + 1}{aa[rng.randint(len(aa))]}' for i in pos) + ']')
+    encoder = environment.featurize.ProteinEncoder(''.join(base), cache=environment.cache.EncodingCache(0, np.int32))
+    return lambda: encoder.batch(deltas)
+
+
+@benchmark(500, 2000)
+def featurizer_fit(n):
+    model, seqs = _featurizer(n, epochs=0)
+    scores = np.random.random_sample(n)
+    return lambda: model.fit(seqs, scores, 1)
+
+
+@benchmark(1000, 10000)
+def featurizer_predict(n):
+    model, seqs = _featurizer(n)
+    return lambda: model.predict(seqs)
+
+
+@benchmark(1000, 10000)
+def featurizer_embed(n):
+    model, seqs = _featurizer(n)
+    return lambda: model.embed(seqs)
+
+
+@benchmark(1000, 10000)
+def featurizer_forward(n):
+    model, seqs = _featurizer(n)
+    return lambda: model.forward(seqs, features=False)
+
+
+def _gp(n):
+    from models.gp import GaussianProcess
+    _seed()
+    encoder = environment.featurize.SeqEncoder(20, cache=_uncached())
+    model = GaussianProcess(encoder, 5, encoder.shape)
+    model.fit(bench.common.dna(n), np.random.random_sample(n), 1)
+    return model, bench.common.dna(500, rng=np.random.RandomState(1))
+
+
+@benchmark(100, 500, 1000)
+def gp_interpolate(n):
+    model, pts = _gp(n)
+    return lambda: model.interpolate(pts)
+
+
+@benchmark(100, 500, 1000)
+def gp_uncertainty(n):
+    model, pts = _gp(n)
+    return lambda: model.uncertainty(pts)
+
+
+@benchmark(100, 300)
+def spgp_induce(n):
+    from models.spgp import SparseGaussianProcess
+    _seed()
+    encoder = environment.featurize.SeqEncoder(20, cache=_uncached())
+    model = SparseGaussianProcess(encoder, 5, encoder.shape, itr=10)
+    X, pts = np.random.normal(size=[n, 5]), np.random.normal(size=[100, 5])
+    Y = np.random.random_sample(n)
+    return lambda: model._induce(X, min(50, n), Y, pts)
+
+
+@benchmark(100, 500, 1000)
+def fittedgp_fit(n):
+    from models.exactgp import FittedGP
+    _seed()
+    model = FittedGP(np.random.normal(size=[n, 5]), np.random.random_sample(n))
+    return lambda: model.fit(epochs=10)
+
+
+@benchmark(100, 500, 1000)
+def fittedgp_predict(n):
+    from models.exactgp import FittedGP
+    _seed()
+    model = FittedGP(np.random.normal(size=[n, 5]), np.random.random_sample(n))
+    model.fit(epochs=1)
+    pts = np.random.normal(size=[1000, 5])
+    return lambda: model.predict(pts)
+
+
+@benchmark(100, 1000)
+def mcmc(n):
+    import utils.mcmc
+    _seed()
+    em = np.random.normal(size=[n, 5])
+    return lambda: utils.mcmc.mcmc(20, em, 100)
+
+
+@benchmark(1000, 5000)
+def bucketer_sample(n):
+    from models.bucket import Bucketer
+    _seed()
+    encoder = environment.featurize.SeqEncoder(20, cache=_uncached())
+    model = Bucketer(encoder, 5, encoder.shape, k=10)
+    model.fit(bench.common.dna(200), np.random.random_sample(200), 1)
+    pts = bench.common.dna(n, rng=np.random.RandomState(1))
+    return lambda: model.sample(pts, 20)
+
+
+@benchmark(10, 50)
+def combinator_sample_action(n):
+    from models.combinator import Combinator
+    _seed()
+    encoder = environment.featurize.SeqEncoder(20, cache=_uncached())
+    model = Combinator(encoder, 5, encoder.shape, k=n, iters=200)
+    mu, sigma = np.random.random_sample(n), np.random.random_sample(n) / 10
+    conj_dists = [lambda i=i: (mu[i], sigma[i]) for i in range(n)]
+    return lambda: model._sample_action(100, n, conj_dists)
+
+
+def _metric(spec):
+    def setup(n):
+        '''Sweep of n labeled sequences in batches of 100, as in a run.'''
+        rng = np.random.RandomState(0)
+        seqs = bench.common.dna(n, rng=rng)
+        labels = dict(zip(seqs, rng.random_sample(n)))
+        prior = dict(list(labels.items())[:100])
+
+        def run():
+            f = eval(spec, environment.metrics.__dict__, {})(prior)
+            seen, data = dict(prior), {seq: y for seq, y in labels.items() if seq not in prior}
+            order = list(data)
+            for i in range(0, len(order) - 100 + 1, 100):
+                sampled = order[i : i + 100]
+                f(seen, data, sampled)
+                for seq in sampled:
+                    seen[seq] = data.pop(seq)
+
+        return run
+    return setup
+
+
+for spec in METRICS:
+    benchmark(1000, 10000, name=f'metric_{spec}')(_metric(spec))
+
+
+def run(pattern=None, repeat=5, verbose=True):
+    '''Return timings of the registered benchmarks whose names match the regex
+    pattern, keyed by "name/size".
+    '''
+    results = {}
+    for name, (setup, sizes) in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        for n in sizes:
+            results[f'{name}/{n}'] = bench.common.measure(setup(n), repeat=repeat)
+            if verbose:
+                print(f'{name}/{n}: {results[f"{name}/{n}"]["min"]:.4g}s', flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='component micro-benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    parser_run = commands.add_parser('run', help='run benchmarks')
+    parser_run.add_argument('-k', type=str, default=None, help='only run benchmarks matching this regex')
+    parser_run.add_argument('--repeat', type=int, default=5, help='timed calls of each benchmark')
+    parser_run.add_argument('--threads', type=int, default=1, help='torch/BLAS threads')
+    parser_run.add_argument('--backend', type=str, default='eager', choices=['eager', 'compile', 'script'], help='model conv trunk backend')
+    parser_run.add_argument('--precision', type=str, default='fp32', choices=['fp32', 'bf16'], help='model conv trunk precision')
+    parser_run.add_argument('--out', type=str, default=None, help='JSON file to save results to')
+    parser_run.add_argument('--baseline', type=str, default=None, help='JSON results to compare against')
+    parser_run.add_argument('--threshold', type=float, default=0.1, help='relative slowdown to flag')
+    parser_compare = commands.add_parser('compare', help='compare saved results')
+    parser_compare.add_argument('baseline', type=str, help='JSON baseline results')
+    parser_compare.add_argument('current', type=str, help='JSON results to check')
+    parser_compare.add_argument('--threshold', type=float, default=0.1, help='relative slowdown to flag')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        utils.threads.limit(args.threads)
+        utils.engine.configure(args.backend, args.precision)
+        current = dict(machine=bench.common.machine(), results=run(args.k, args.repeat))
+        if args.out:
+            bench.common.save(args.out, current)
+        if not args.baseline:
+            return 0
+        baseline = bench.common.load(args.baseline)
+    else:
+        baseline, current = map(bench.common.load, [args.baseline, args.current])
+    if baseline['machine']['host'] != current['machine']['host']:
+        print(f'warning: comparing results from {baseline["machine"]["host"]} and {current["machine"]["host"]}')
+    rows, slower = bench.common.compare(baseline['results'], current['results'], args.threshold)
+    bench.common.report(rows, slower, args.threshold)
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
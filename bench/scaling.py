@@ -0,0 +1,150 @@
+import multiprocessing
+import argparse
+import resource
+import random
+import sys
+import re
+import numpy as np
+import torch
+import bench.common
+import environment.env
+import utils.registry
+import utils.threads
+
+ENVS = ['ClusterEnv(dlen={dlen})', 'MotifEnv(dlen={dlen})', 'GenericEnv("data/toy/20mer.csv")']
+METRICS = ['Phase("act")', 'Phase("observe")']
+
+
+def agent_names():
+    '''Return names of the agent factories defined in agents/.'''
+    return [name for name in utils.registry.Registry('agents').modules if name.endswith('Agent') and name != 'BaseAgent']
+
+
+def measure(agent, env, dlen, batch, pretrain, cutoff, threads, seed=0):
+    '''Run agent spec on environment spec env with about dlen sequences for
+    cutoff iterations, returning throughput and mean latency of act and observe
+    (excluding pretraining), peak RSS, and its growth over the RSS after imports
+    (both in MB). Environments without a {dlen} field are subsampled to dlen
+    sequences. Meant to run in a fresh process, so the peak RSS is the run's own.
+    '''
+    utils.threads.limit(threads)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    make = lambda validation: eval(env.format(dlen=dlen), environment.env.__dict__)(
+        batch=batch, validation=validation, pretrain=pretrain)
+    instance = make(0.)
+    if '{dlen}' not in env and len(instance.env) > dlen:
+        instance = make(1 - dlen / len(instance.env))
+    registry = utils.registry.Registry('agents')
+    results = instance.run(eval(agent, {}, registry), cutoff, METRICS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    act, observe = (np.array(results[f'Phase("{phase}")']) for phase in ['act', 'observe'])
+    latency = float(np.mean(act + observe)) if len(act) else np.nan
+    return dict(agent=agent, env=env, dlen=dlen, pool=len(instance.env) - pretrain, batch=batch, seen=pretrain,
+                iterations=len(act), throughput=batch / latency, latency=latency,
+                act=float(np.mean(act)) if len(act) else np.nan, observe=float(np.mean(observe)) if len(act) else np.nan,
+                peak_rss=peak, rss_growth=peak - base)
+
+
+def run(agent, env, dlen, batch, pretrain, cutoff, threads, timeout):
+    '''Run measure in a fresh spawned process, returning None on timeout or error.'''
+    pool = multiprocessing.get_context('spawn').Pool(1)
+    try:
+        result = pool.apply_async(measure, (agent, env, dlen, batch, pretrain, cutoff, threads)).get(timeout)
+        pool.close()
+        pool.join()
+        return result
+    except multiprocessing.TimeoutError:
+        print(f'{agent} on {env} with {dlen} sequences timed out', flush=True)
+    except Exception as e:
+        print(f'{agent} on {env} with {dlen} sequences failed: {e!r}', flush=True)
+    pool.terminate()
+
+
+def exponent(x, y):
+    '''Return slope of the least squares fit of log y against log x, the
+    empirical exponent k of y = O(x^k), or NaN without two distinct x.
+    '''
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    valid = (x > 0) & (y > 0)
+    if len(np.unique(x[valid])) < 2:
+        return np.nan
+    return float(np.polyfit(np.log(x[valid]), np.log(y[valid]), 1)[0])
+
+
+def fit(rows):
+    '''Return per (agent, env) summary of measurement rows with the exponents of
+    iteration latency and RSS growth in pool size (at the smallest seen count) and
+    of latency in seen count (at the smallest pool size), for the first batch size.
+    '''
+    summary = []
+    for agent, env in dict.fromkeys((row['agent'], row['env']) for row in rows):
+        group = [row for row in rows if (row['agent'], row['env']) == (agent, env)]
+        batch = group[0]['batch']
+        group = [row for row in group if row['batch'] == batch]
+        seen = min(row['seen'] for row in group)
+        by_pool = sorted([row for row in group if row['seen'] == seen], key=lambda row: row['pool'])
+        dlen = min(row['dlen'] for row in group)
+        by_seen = [row for row in group if row['dlen'] == dlen]
+        summary.append(dict(agent=agent, env=env, batch=batch,
+            pool=exponent([row['pool'] for row in by_pool], [row['latency'] for row in by_pool]),
+            seen=exponent([row['seen'] for row in by_seen], [row['latency'] for row in by_seen]),
+            memory=exponent([row['pool'] for row in by_pool], [row['rss_growth'] for row in by_pool]),
+            throughput=by_pool[-1]['throughput'], peak_rss=by_pool[-1]['peak_rss'], largest=by_pool[-1]['pool']))
+    return summary
+
+
+def report(summary, flag):
+    '''Print summary from fit, flagging exponents in pool size of at least flag.'''
+    width = max([len(row['agent']) for row in summary] + [5])
+    ewidth = max([len(row['env']) for row in summary] + [3])
+    print(f'{"agent":<{width}} {"env":<{ewidth}} {"pool^k":>6} {"seen^k":>6} {"mem^k":>6} {"seq/s":>9} {"MB":>7}')
+    for row in summary:
+        mark = '  QUADRATIC+' if row['pool'] >= flag else ''
+        print(f'{row["agent"]:<{width}} {row["env"]:<{ewidth}} {row["pool"]:>6.2f} {row["seen"]:>6.2f} '
+              f'{row["memory"]:>6.2f} {row["throughput"]:>9.1f} {row["peak_rss"]:>7.0f}{mark}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='agent scaling benchmark')
+    parser.add_argument('--agents', nargs='+', type=str, default=None, help='agent specs (default every agent in agents/)')
+    parser.add_argument('-k', type=str, default=None, help='only run agents matching this regex')
+    parser.add_argument('--envs', nargs='+', type=str, default=ENVS, help='environment specs, with {dlen} for the data size')
+    parser.add_argument('--dlen', nargs='+', type=int, default=[1000, 3000, 10000], help='data sizes')
+    parser.add_argument('--batch', nargs='+', type=int, default=[100], help='batch sizes')
+    parser.add_argument('--seen', nargs='+', type=int, default=[100], help='pretraining (seen) sequence counts')
+    parser.add_argument('--epochs', type=int, default=1, help='training epochs of each agent')
+    parser.add_argument('--cutoff', type=int, default=3, help='iterations of each run')
+    parser.add_argument('--threads', type=int, default=1, help='torch/BLAS threads of each run')
+    parser.add_argument('--timeout', type=int, default=600, help='max seconds for each run; larger sizes are skipped after a timeout')
+    parser.add_argument('--flag', type=float, default=1.8, help='pool size exponent to flag as quadratic or worse')
+    parser.add_argument('--out', type=str, default=None, help='JSON file to save measurements and fits to')
+    args = parser.parse_args(argv)
+
+    agents = args.agents or [f'{name}(epochs={args.epochs})' for name in agent_names()]
+    agents = [agent for agent in agents if not args.k or re.search(args.k, agent)]
+    rows = []
+    for agent in agents:
+        for env in args.envs:
+            for batch in args.batch:
+                for seen in args.seen:
+                    pool = 0
+                    for dlen in sorted(args.dlen):
+                        row = run(agent, env, dlen, batch, seen, args.cutoff, args.threads, args.timeout)
+                        if row is None or row['pool'] <= pool: # timed out, or no larger than the data
+                            break
+                        print(f'{agent} {env} pool={row["pool"]} batch={batch} seen={seen}: '
+                              f'{row["throughput"]:.1f} seq/s, {row["latency"]:.3g}s/iteration, {row["peak_rss"]:.0f}MB', flush=True)
+                        rows.append(row)
+                        pool = row['pool']
+    summary = fit(rows)
+    report(summary, args.flag)
+    if args.out:
+        bench.common.save(args.out, dict(machine=bench.common.machine(), rows=rows, summary=summary))
+    return 1 if any(row['pool'] >= args.flag for row in summary) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
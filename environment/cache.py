@@ -0,0 +1,157 @@
+import numpy as np
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import hashlib
+import atexit
+import os
+
+config = dict(capacity=100000, shared=False, width=64)
+
+
+def configure(capacity=None, shared=None, width=None):
+    '''Set the defaults used by make for caches created afterwards.
+    capacity: max number of cached entries
+    shared: back caches with shared memory visible to all worker processes
+    width: max row width of shared caches
+    '''
+    for key, value in dict(capacity=capacity, shared=shared, width=width).items():
+        if value is not None:
+            config[key] = value
+
+
+def make(dtype):
+    '''Return a new encoding cache for rows of dtype using the configured defaults.'''
+    if config['shared']:
+        return SharedEncodingCache(config['capacity'], config['width'], dtype)
+    return EncodingCache(config['capacity'], dtype)
+
+
+class EncodingCache:
+    '''Size-bounded LRU cache from sequences to variable length integer rows,
+    stored compactly in one preallocated array. Counts hits, misses and evictions.
+    '''
+
+    def __init__(self, capacity, dtype):
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.slots = OrderedDict() # key to slot, in least recently used order
+        self.rows = np.empty([0, 0], dtype=self.dtype)
+        self.lengths = np.zeros([capacity], dtype=np.int32)
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def get(self, key):
+        '''Return cached row for key, or None.'''
+        slot = self.slots.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.slots.move_to_end(key)
+        return self.rows[slot, : self.lengths[slot]]
+
+    def put(self, key, row):
+        '''Cache row for key, evicting the least recently used entry if full.'''
+        if self.capacity <= 0 or key in self.slots:
+            return
+        if len(row) > self.rows.shape[1] or len(self.rows) == 0:
+            # allocate lazily once the row width is known, widening if needed
+            rows = np.zeros([self.capacity, max(len(row), self.rows.shape[1])], dtype=self.dtype)
+            rows[: len(self.rows), : self.rows.shape[1]] = self.rows
+            self.rows = rows
+        if len(self.slots) < self.capacity:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)
+            self.evictions += 1
+        self.slots[key] = slot
+        self.rows[slot, : len(row)] = row
+        self.lengths[slot] = len(row)
+
+    def reset_stats(self):
+        '''Zero the hit, miss and eviction counts.'''
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        '''Return dictionary of hit, miss, eviction, entry and byte counts.'''
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    entries=len(self), bytes=self.rows.nbytes + self.lengths.nbytes)
+
+
+class SharedEncodingCache:
+    '''Size-bounded direct-mapped cache from sequences to integer rows of at most
+    width entries, held in shared memory so all workers on a node reuse one copy.
+    Keys are stable 64 bit hashes, and a colliding entry evicts the previous one.
+    Processes attach to an existing cache by name, which is also how it pickles.
+    '''
+
+    def __init__(self, capacity, width, dtype, name=None):
+        self.capacity = capacity
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        size = capacity * (8 + 4 + width * self.dtype.itemsize)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.keys = np.ndarray([capacity], dtype=np.uint64, buffer=self.shm.buf)
+        self.lengths = np.ndarray([capacity], dtype=np.int32, buffer=self.shm.buf, offset=8 * capacity)
+        self.rows = np.ndarray([capacity, width], dtype=self.dtype, buffer=self.shm.buf, offset=12 * capacity)
+        self.hits = self.misses = self.evictions = 0
+        if self.owner:
+            self.keys[:] = 0
+            pid = os.getpid()
+            atexit.register(lambda: os.getpid() == pid and self.unlink())
+
+    def __reduce__(self):
+        return SharedEncodingCache, (self.capacity, self.width, self.dtype, self.shm.name)
+
+    def _hash(self, key):
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+        return max(h, 1) # 0 marks an empty slot
+
+    def get(self, key):
+        '''Return copy of cached row for key, or None.'''
+        h = self._hash(key)
+        slot = h % self.capacity
+        if self.keys[slot] == h:
+            row = self.rows[slot, : self.lengths[slot]].copy()
+            if self.keys[slot] == h: # not overwritten while reading
+                self.hits += 1
+                return row
+        self.misses += 1
+        return None
+
+    def put(self, key, row):
+        '''Cache row for key, replacing any entry in its slot. Rows wider than
+        self.width are not cached.
+        '''
+        if len(row) > self.width:
+            return
+        h = self._hash(key)
+        slot = h % self.capacity
+        if self.keys[slot] not in (0, h):
+            self.evictions += 1
+        self.keys[slot] = 0
+        self.rows[slot, : len(row)] = row
+        self.lengths[slot] = len(row)
+        self.keys[slot] = h
+
+    def reset_stats(self):
+        '''Zero this process's hit, miss and eviction counts.'''
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        '''Return dictionary of this process's hit, miss and eviction counts, and
+        shared entry and byte counts.
+        '''
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    entries=int((self.keys != 0).sum()), bytes=self.shm.size)
+
+    def unlink(self):
+        '''Release the shared memory block.'''
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,85 @@
+import numpy as np
+import hashlib
+import json
+import os
+
+CACHE_DIR = 'data/cache'
+VERSION = 2
+
+
+class Dataset:
+    '''Sequences and labels from a binary dataset cache directory, memory-mapped
+    so that processes loading the same dataset share pages, or held in memory.
+    '''
+
+    def __init__(self, path, seqs=None, labels=None):
+        '''path: cache directory, or None to hold seqs and labels in memory'''
+        self.path = path
+        if path is None:
+            self.seqs, self.labels = np.array(seqs, dtype=str), np.array(labels, dtype=np.float64)
+        else:
+            self.seqs = np.load(f'{path}/seqs.npy', mmap_mode='r')
+            self.labels = np.load(f'{path}/labels.npy', mmap_mode='r')
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def items(self):
+        '''Return list of (sequence, label) pairs.'''
+        return list(zip(self.seqs.tolist(), self.labels.tolist()))
+
+    def codes(self, encoder):
+        '''Return memory-mapped codes of all sequences under encoder, encoding
+        and caching them on first use (or just encoding them if held in memory).
+        '''
+        if self.path is None:
+            return encoder.unpack(np.asarray(encoder.codes(self.seqs)))
+        name = f'codes-{type(encoder).__name__}-{"x".join(map(str, encoder.shape))}.npy'
+        if not os.path.exists(f'{self.path}/{name}'):
+            _save(f'{self.path}/{name}', np.asarray(encoder.codes(self.seqs)))
+        return encoder.unpack(np.load(f'{self.path}/{name}', mmap_mode='r'))
+
+
+def _save(path, arr):
+    '''Write array atomically, so concurrent workers never read a partial file.'''
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+def _build(path, meta, parse):
+    '''Write dataset from parse into path unless it is already complete.'''
+    if not os.path.exists(f'{path}/meta.json'):
+        os.makedirs(path, exist_ok=True)
+        seqs, labels = parse()
+        _save(f'{path}/seqs.npy', np.array(seqs, dtype=str))
+        _save(f'{path}/labels.npy', np.array(labels, dtype=np.float64))
+        with open(f'{path}/meta.json.{os.getpid()}.tmp', 'w') as f:
+            json.dump(dict(version=VERSION, size=len(seqs), **meta), f)
+        os.replace(f'{path}/meta.json.{os.getpid()}.tmp', f'{path}/meta.json')
+    return Dataset(path)
+
+
+def load(name, files, parse):
+    '''Load dataset name built from the source files, converting it once into
+    a versioned binary cache in CACHE_DIR keyed by the file sizes and
+    modification times.
+    parse: function returning (sequences, labels) from the source files
+    '''
+    stats = [(f, os.stat(f).st_size, os.stat(f).st_mtime_ns) for f in files]
+    key = hashlib.sha1(json.dumps([VERSION, name, stats]).encode()).hexdigest()[:16]
+    return _build(f'{CACHE_DIR}/{name}-{key}', dict(name=name, files=stats), parse)
+
+
+def generate(name, params, make, cache=False):
+    '''Generate synthetic dataset name in memory, or if cache is set, generate it
+    once into a versioned binary cache in CACHE_DIR keyed by params, which must
+    include the generator seed. Caching only pays off if the same seeds are run
+    again, as each generated dataset takes its own directory.
+    make: function returning (sequences, labels) for params
+    '''
+    if not cache:
+        return Dataset(None, *make())
+    key = hashlib.sha1(json.dumps([VERSION, name, params], sort_keys=True).encode()).hexdigest()[:16]
+    return _build(f'{CACHE_DIR}/{name}-{key}', dict(name=name, params=params), make)
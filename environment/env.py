@@ -8,60 +8,158 @@ from functools import partial
 import environment.motif as motif
 import environment.metrics as metrics
 import environment.featurize
+import environment.dataset
+import utils.checkpoint
+import utils.timing
+import utils.memory
+import json
 import time
 import gc
 import torch
 import traceback
 
 
+class Results(dict):
+    '''Dictionary mapping each metric to its evaluation at each timestep of a run,
+    with truncated set if the run stopped early at its time budget (and can be
+    resumed), or failed set if it stopped on an error.
+    '''
+
+    def __init__(self, results, truncated=False, failed=False):
+        super().__init__({metric: np.array(result) for metric, result in results.items()})
+        self.truncated = truncated
+        self.failed = failed
+
+
 class _Env:
     '''Stores labeled sequences, reserving some for validation, and runs agents on them. Should be extended with custom
     constructor to set up data.
     '''
 
-    def run(self, Agent, cutoff, metrics, name=None, pos=0):
+    Encoder = environment.featurize.SeqEncoder # encoder class for DNA environments
+
+    def run(self, Agent, cutoff, metrics, name=None, pos=0, checkpoint=None, interval=10, budget=None):
         '''Run agent, getting batch-sized list of actions (sequences) to try,
         and calling observe with the labeled sequences until all sequences
         have been tried (or the batch number specified by the cutoff parameter
-        has been reached). Returns a dictionary mapping each metric in metrics 
+        has been reached). Returns Results mapping each metric in metrics 
         to its evaluation at each timestep. The name and pos parameters are 
-        used for a progress bar.
+        used for a progress bar. Agents with the ids attribute set act on arrays
+        of integer sequence IDs, the rows of self.encode, drawn from a pool kept
+        by swap-removal so each step costs O(batch).
+        checkpoint: path prefix to append each iteration's metrics and selections
+            to {checkpoint}.jsonl and snapshot the run to {checkpoint}.ckpt; a run
+            with an existing snapshot resumes from it
+        interval: iterations between snapshots, or 0 to neither snapshot nor log
+        budget: wall-clock seconds after which the run stops before any iteration
+            expected to overrun it, returning truncated results (and snapshotting)
+        A RuntimeError raised by the agent ends the run, returning failed results.
+        Time spent in each phase of an iteration is recorded by utils.timing, which
+        can also log it to {checkpoint}.events.jsonl and profile one iteration, and
+        utils.memory can save allocation snapshots after chosen iterations.
         '''
-        data, prior = self.split_data()
+        start = time.time()
+        last = 0. # duration of the last iteration
+        utils.memory.start()
+        keep = checkpoint and interval # whether to log and snapshot the run
+        snapshot = utils.checkpoint.load(f'{checkpoint}.ckpt') if keep else None
+        if snapshot is None:
+            data, prior = self.split_data()
+            seen = prior.copy()
+            iteration = 0
+        else:
+            data, prior, seen, iteration = (snapshot[x] for x in ['data', 'prior', 'seen', 'iteration'])
         if cutoff is None:
-            cutoff = 1 + len(data) // self.batch
-        pbar = tqdm(total=min(len(data) // self.batch * self.batch, cutoff * self.batch), 
-                        position=pos, desc=name)
-        iteration = 0
-        seen = prior.copy()
+            cutoff = 1 + (len(data) + len(seen) - len(prior)) // self.batch
+        pbar = tqdm(total=min((len(data) + len(seen) - len(prior)) // self.batch * self.batch, cutoff * self.batch), 
+                        position=pos, desc=name, initial=iteration * self.batch)
         evaluators = [(metric, eval(metric, environment.metrics.__dict__, {})(prior)) for metric in metrics]
         agent = Agent(prior, self.shape, self.batch, self.encode)
         results = {metric: [] for metric, f in evaluators}
-
-        while len(data) >= self.batch and (cutoff is None or iteration < cutoff):
-            try:
-                sampled = agent.act(list(data.keys()))
-                assert len(set(sampled)) == self.batch, "bad action"
-                agent.observe({seq: data[seq] for seq in sampled})
-            except RuntimeError:
-                traceback.print_exc()
-                del agent
-                gc.collect()
-                torch.cuda.empty_cache()
-                return {metric: np.array(result) for metric, result in results.items()}
-
-            for metric, f in evaluators:
-                results[metric].append(f(seen, data, sampled))
-
-            for seq in sampled:
-                seen[seq] = data[seq]
-                del data[seq]
-
-            pbar.update(self.batch)
-            iteration += 1
-
-        pbar.close()
-        return {metric: np.array(result) for metric, result in results.items()}
+        if snapshot is not None:
+            utils.checkpoint.load_state_dict(agent, snapshot['agent'])
+            for (metric, f), state in zip(evaluators, snapshot['metrics']):
+                utils.checkpoint.load_state_dict(f, state)
+            results = snapshot['results']
+            utils.checkpoint.set_rng_state(snapshot['rng'])
+        if keep:
+            # drop log entries past the snapshot being resumed from
+            lines = open(f'{checkpoint}.jsonl').readlines()[:iteration] if snapshot is not None else []
+            log = open(f'{checkpoint}.jsonl', 'w')
+            log.writelines(lines)
+            log.flush()
+        if agent.ids:
+            pool = self.encode.rows(list(data.keys())) if snapshot is None or snapshot['pool'] is None \
+                else snapshot['pool'] # remaining sequence IDs in pool[:len(data)]
+            assert (pool >= 0).all(), "sequences missing from store"
+            where = np.empty([len(self.encode)], dtype=np.intp) # position of each ID in pool
+            where[pool] = np.arange(len(pool))
+
+        def save():
+            utils.checkpoint.save(f'{checkpoint}.ckpt', dict(
+                iteration=iteration, data=data, prior=prior, seen=seen, results=results,
+                agent=utils.checkpoint.state_dict(agent),
+                metrics=[utils.checkpoint.state_dict(f) for metric, f in evaluators],
+                pool=pool[:len(data)].copy() if agent.ids else None, rng=utils.checkpoint.rng_state()))
+
+        utils.timing.start(f'{checkpoint}.events.jsonl' if checkpoint and utils.timing.config['events'] else None, iteration)
+        try:
+            while len(data) >= self.batch and (cutoff is None or iteration < cutoff):
+                if budget is not None and time.time() + last > start + budget:
+                    if keep:
+                        save()
+                    return Results(results, truncated=True)
+                begin = time.time()
+                with utils.timing.profile(iteration, f'{checkpoint or "run"}-{iteration}'):
+                    try:
+                        with utils.timing.phase('act'):
+                            if agent.ids:
+                                chosen = np.asarray(agent.act(pool[:len(data)]))
+                                sampled = self.encode.seqs[chosen].tolist()
+                            else:
+                                sampled = agent.act(list(data.keys()))
+                        assert len(set(sampled)) == self.batch, "bad action"
+                        with utils.timing.phase('observe'):
+                            agent.observe({seq: data[seq] for seq in sampled})
+                    except RuntimeError:
+                        traceback.print_exc()
+                        del agent
+                        gc.collect()
+                        torch.cuda.empty_cache()
+                        return Results(results, failed=True)
+
+                    with utils.timing.phase('metrics'):
+                        for metric, f in evaluators:
+                            results[metric].append(f(seen, data, sampled))
+
+                utils.memory.snapshot(iteration, f'{checkpoint or "run"}-{iteration}')
+
+                for i, seq in enumerate(sampled):
+                    if agent.ids:
+                        # move the tail ID of the pool into the chosen one's place
+                        tail = pool[len(data) - 1]
+                        pool[where[chosen[i]]], where[tail] = tail, where[chosen[i]]
+                    seen[seq] = data[seq]
+                    del data[seq]
+
+                pbar.update(self.batch)
+                iteration += 1
+                utils.timing.lap()
+
+                if keep:
+                    log.write(json.dumps(dict(iteration=iteration, selected=list(sampled),
+                        metrics={metric: result[-1] for metric, result in results.items()}), default=float) + '\n')
+                    log.flush()
+                    if iteration % interval == 0:
+                        save()
+                last = time.time() - begin
+        finally:
+            pbar.close()
+            utils.timing.stop()
+            utils.memory.stop()
+            if keep:
+                log.close()
+        return Results(results)
 
     def split_data(self):
         '''Splits the environment run dictionary self.env into an observed prior portion
@@ -82,7 +180,7 @@ class _Env:
         self.env: {X: Y ...} data dictionary for running
         self.val: (X, Y) validation data
         self.shape: encoded sequence shape
-        self.encode: convert sequence to tensor
+        self.encode: convert sequence to tensor, usually a store built with self._store
         '''
         assert 0 <= validation < 1
         self.batch = batch
@@ -90,23 +188,38 @@ class _Env:
         self.cache = {}
         self.pretrain = pretrain
 
+    def _store(self, encoder, dataset=None):
+        '''Set self.encode to a store of every environment and validation sequence
+        encoded once with encoder, and self.shape to the encoded shape. If a cached
+        dataset is provided, its sequences and memory-mapped codes are used instead.
+        '''
+        if dataset is None:
+            self.encode = environment.featurize.SequenceStore(encoder, [*self.env, *(self.val[0] if self.val else ())])
+        else:
+            self.encode = environment.featurize.SequenceStore(encoder, dataset.seqs, dataset.codes(encoder))
+        self.shape = self.encode.shape
+
 
 class GuideEnv(_Env):
     '''CRISPR guide environment with on-target labels.'''
 
     def __init__(self, batch, validation, pretrain):
         super().__init__(batch, validation, pretrain)
-        files=[f'data/DeepCRISPR/{f}' for f in os.listdir('data/DeepCRISPR') if f.endswith('.csv')]
-        dfs = list(map(pd.read_csv, files))
-        data = [(strand + seq, score) for df in dfs
-            for _, strand, seq, score in 
-            df[['Strand', 'sgRNA', 'Normalized efficacy']].itertuples()]
+        files=sorted(f'data/DeepCRISPR/{f}' for f in os.listdir('data/DeepCRISPR') if f.endswith('.csv'))
+
+        def parse():
+            dfs = list(map(pd.read_csv, files))
+            return zip(*[(strand + seq, score) for df in dfs
+                for _, strand, seq, score in 
+                df[['Strand', 'sgRNA', 'Normalized efficacy']].itertuples()])
+
+        dataset = environment.dataset.load('DeepCRISPR', files, parse)
+        data = dataset.items()
         shuffle(data)
-        self.encode = environment.featurize.SeqEncoder(len(data[0][0]) - 1)
-        self.shape = self.encode.shape
         r = int(validation * len(data))
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
+        self._store(self.Encoder(len(data[0][0]) - 1), dataset)
         assert batch < len(self.env)
 
 
@@ -124,27 +237,33 @@ class FlankEnv(_Env):
         r = int(dlen * validation)
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
-        self.encode = environment.featurize.SeqEncoder(len(data[0][0]) - 1)
-        self.shape = self.encode.shape
+        self._store(self.Encoder(len(data[0][0]) - 1))
 
 
 class _GenericEnv(_Env):
 
     def __init__(self, data, header, batch, validation, pretrain):
         super().__init__(batch, validation, pretrain)
-        if header:
-            data = pd.read_csv(data, comment='#')[[*header]].values
-        else:
-            data = pd.read_csv(data, comment='#').values
-        data[:, 1] -= data[:, 1].min()
-        data[:, 1] /= data[:, 1].max()
-        data[:, 0] = np.vectorize(lambda s: s if s[0] in '+-' else '+' + s)(data[:, 0])
-        assert data.shape[1] == 2
+        path = data
+
+        def parse():
+            if header:
+                data = pd.read_csv(path, comment='#')[[*header]].values
+            else:
+                data = pd.read_csv(path, comment='#').values
+            data[:, 1] -= data[:, 1].min()
+            data[:, 1] /= data[:, 1].max()
+            data[:, 0] = np.vectorize(lambda s: s if s[0] in '+-' else '+' + s)(data[:, 0])
+            assert data.shape[1] == 2
+            return data[:, 0], data[:, 1]
+
+        name = os.path.splitext(os.path.basename(path))[0] + ('-' + '-'.join(map(str, header)) if header else '')
+        dataset = environment.dataset.load(name, [path], parse)
+        data = dataset.items()
         r = int(len(data) * validation)
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
-        self.encode = environment.featurize.SeqEncoder(len(data[0][0]) - 1)
-        self.shape = self.encode.shape
+        self._store(self.Encoder(len(data[0][0]) - 1), dataset)
 
 
 def GenericEnv(data, header=None):
@@ -155,42 +274,49 @@ def GenericEnv(data, header=None):
 
 class _MotifEnv(_Env):
 
-    def __init__(self, N, lam, comp, var, batch, validation, pretrain):
+    def __init__(self, N, lam, comp, var, dlen, cache, batch, validation, pretrain):
         super().__init__(batch, validation, pretrain)
+        self.cache_data = cache
         self.N = N
         self.lam = lam
         self.comp = comp
         self.var = var
+        self.dlen = dlen
 
-    def _make_data(self, dlen=30000):
-        data = motif.make_data(dlen, N=self.N, lam=self.lam, comp=self.comp, var=self.var)
+    def _make_data(self, dlen):
+        seed = np.random.randint(1 << 31) # drawn from the run seed, so each rep has its own dataset
+        params = dict(N=self.N, lam=self.lam, comp=self.comp, var=self.var, dlen=dlen, seed=seed)
+        dataset = environment.dataset.generate('motif', params, lambda: zip(*motif.make_data(
+            dlen, N=self.N, lam=self.lam, comp=self.comp, var=self.var, rng=np.random.RandomState(seed))), self.cache_data)
+        data = dataset.items()
         r = int(len(data) * self.validation)
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
-        self.encode = environment.featurize.SeqEncoder(len(data[0][0]) - 1)
-        self.shape = self.encode.shape
+        self._store(self.Encoder(len(data[0][0]) - 1), dataset)
 
     def run(self, *args, **kwargs):
-        self._make_data()
+        self._make_data(self.dlen)
         return super().run(*args, **kwargs)
 
 
-def MotifEnv(N=100, lam=1., comp=0.5, var=0.5):
+def MotifEnv(N=100, lam=1., comp=0.5, var=0.5, dlen=30000, cache=False):
     '''Parameterized environment with sequences containing on average
     lam motifs (which determine its scores). N motifs are present across
     all sequences in the environment.
     comp: scales with stochasticity of PWMs used to make motifs.
     var: max motif score variance
+    dlen: number of data points.
+    cache: keep each run's dataset in environment.dataset.CACHE_DIR to reuse when rerun with its seed.
     '''
-    return partial(_MotifEnv, N, lam, comp, var)
+    return partial(_MotifEnv, N, lam, comp, var, dlen, cache)
 
 
 class _ClusterEnv(_Env):
 
-    def __init__(self, N, comp, var, dlen, padding, zclust, skew, batch, validation, pretrain):
+    def __init__(self, N, comp, var, dlen, padding, zclust, skew, cache, batch, validation, pretrain):
         super().__init__(batch, validation, pretrain)
-        self.encode = environment.featurize.SeqEncoder(20)
-        self.shape = self.encode.shape
+        self.cache_data = cache
+        self.shape = self.Encoder(20).shape
         self.dlen = dlen
         self.padding = padding
         self.zclust = zclust
@@ -199,33 +325,43 @@ class _ClusterEnv(_Env):
         self.var = var
         self.skew = skew
 
-    def _make_data(self, dlen):
-        motifs = [(motif.make_motif(self.shape[0], self.comp), 
-            random() - 1 / 2, random() * self.var) for _ in range(self.N)]
+    def _generate(self, dlen, rng):
+        '''Return list of labeled sequences in a new dataset sampled with rng.'''
+        motifs = np.stack([motif.make_motif(self.shape[0], self.comp, rng) for _ in range(self.N)])
+        mu, sigma = rng.random_sample(self.N) - 1 / 2, rng.random_sample(self.N) * self.var
         if self.skew > 1.:
             sizes = np.arange(self.N, dtype=np.float64)
             sizes += (sizes[-1] - sizes[0] * self.skew) / (self.skew - 1.)
-            sizes *= self.dlen / sizes.sum()
-            sizes = np.rint(sizes).astype(np.int)
+            sizes *= dlen / sizes.sum()
+            sizes = np.rint(sizes).astype(int)
         else:
-            sizes = np.rint(np.array([self.dlen // self.N] * self.N)).astype(np.int)
-        data = [(choice('+-') + motif.seq(m), 1 / (1 + np.exp(-np.random.normal(mu, sigma))))
-                    for i, (m, mu, sigma) in enumerate(motifs) for z in range(sizes[i])]
-        motif.pad(data, n=len(data) + self.padding)
-        zmotif = motif.make_motif(self.shape[0], self.comp)
-        data += [(choice('+-') + motif.seq(zmotif), 0.) 
-                    for _ in range(self.zclust)]
-        shuffle(data)
+            sizes = np.rint(np.array([dlen // self.N] * self.N)).astype(int)
+        idx = np.repeat(np.arange(self.N), sizes)
+        seqs = motif.strings(motif.sample(motifs, len(idx), rng, idx), rng.randint(2, size=len(idx)))
+        data = list(zip(seqs, 1 / (1 + np.exp(-rng.normal(mu[idx], sigma[idx])))))
+        motif.pad(data, n=len(data) + self.padding, rng=rng)
+        zmotif = motif.make_motif(self.shape[0], self.comp, rng)
+        data += [(x, 0.) for x in motif.strings(motif.sample(zmotif, self.zclust, rng), rng.randint(2, size=self.zclust))]
+        return [data[i] for i in rng.permutation(len(data))]
+
+    def _make_data(self, dlen):
+        seed = np.random.randint(1 << 31) # drawn from the run seed, so each rep has its own dataset
+        params = dict(N=self.N, comp=self.comp, var=self.var, dlen=dlen, padding=self.padding,
+                      zclust=self.zclust, skew=self.skew, size=self.shape[0], seed=seed)
+        dataset = environment.dataset.generate('cluster', params,
+            lambda: zip(*self._generate(dlen, np.random.RandomState(seed))), self.cache_data)
+        data = dataset.items()
         r = int(len(data) * self.validation)
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
+        self._store(self.Encoder(self.shape[0]), dataset)
 
     def run(self, *args, **kwargs):
         self._make_data(self.dlen)
         return super().run(*args, **kwargs)
 
 
-def ClusterEnv(N=100, comp=0.5, var=0.5, dlen=30000, padding=0, zclust=0, skew=1.):
+def ClusterEnv(N=100, comp=0.5, var=0.5, dlen=30000, padding=0, zclust=0, skew=1., cache=False):
     '''Parameterized environment with sequences in N clusters all with the
     same motif PWM.
     comp: scales with stochasticity of PWMs used to make motifs.
@@ -234,23 +370,29 @@ def ClusterEnv(N=100, comp=0.5, var=0.5, dlen=30000, padding=0, zclust=0, skew=1
     padding: additional random sequences with 0 labels.
     zclust: additional cluster size around 0.
     skew: size ratio between largest and smallest clusters, with other sizes interpolated linearly.
+    cache: keep each run's dataset in environment.dataset.CACHE_DIR to reuse when rerun with its seed.
     '''
-    return partial(_ClusterEnv, N, comp, var, dlen, padding, zclust, skew)
+    return partial(_ClusterEnv, N, comp, var, dlen, padding, zclust, skew, cache)
 
 
 class _ProteinEnv(_Env):
     
     def __init__(self, source, batch, validation, pretrain):
         super().__init__(batch, validation, pretrain)
-        base_seq = open(f'data/MaveDB/seqs/{source}.txt').read().strip()
-        df = pd.read_csv(f'data/MaveDB/scores/{source}.csv.gz', delimiter=r',', engine='python', compression='gzip')
-        data = [(x, y) for x, y in zip(df.hgvs_pro.values, 1 / (1 + np.exp(-df.score.values))) if not np.isnan(y)]
+        files = [f'data/MaveDB/seqs/{source}.txt', f'data/MaveDB/scores/{source}.csv.gz']
+        base_seq = open(files[0]).read().strip()
+
+        def parse():
+            df = pd.read_csv(files[1], delimiter=r',', engine='python', compression='gzip')
+            return zip(*[(x, y) for x, y in zip(df.hgvs_pro.values, 1 / (1 + np.exp(-df.score.values))) if not np.isnan(y)])
+
+        dataset = environment.dataset.load(f'MaveDB-{source}', files, parse)
+        data = dataset.items()
         shuffle(data)
         r = int(len(data) * validation)
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
-        self.encode = environment.featurize.ProteinEncoder(base_seq)
-        self.shape = self.encode.shape
+        self._store(environment.featurize.ProteinEncoder(base_seq), dataset)
 
 
 def ProteinEnv(source):
@@ -264,16 +406,20 @@ class _PrimerEnv(_Env):
 
     def __init__(self, mer, batch, validation, pretrain):
         super().__init__(batch, validation, pretrain)
-        df = pd.read_csv('data/primers/primers.txt', delimiter='\t')
         xcol = {None: 'probe', 20: 'probe_20mer', 30: 'probe_30mer'}
         assert mer in xcol, 'valid options are {None, 20, 30}'
-        data = [('+' + x, y) for x, y in zip(df[xcol[mer]], df.frac_on_target)]
+
+        def parse():
+            df = pd.read_csv('data/primers/primers.txt', delimiter='\t')
+            return ['+' + x for x in df[xcol[mer]]], df.frac_on_target.values
+
+        dataset = environment.dataset.load(f'primers-{xcol[mer]}', ['data/primers/primers.txt'], parse)
+        data = dataset.items()
         shuffle(data)
         r = int(len(data) * validation)
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
-        self.encode = environment.featurize.SeqEncoder(len(data[0][0]) - 1)
-        self.shape = self.encode.shape
+        self._store(self.Encoder(len(data[0][0]) - 1), dataset)
 
 
 def PrimerEnv(mer=None):
@@ -291,14 +437,18 @@ class MPRAEnv(_Env):
         files = ['data/MPRA/mpra_endo_scramble.txt',
                  'data/MPRA/mpra_endo_tss_lb.txt',
                  'data/MPRA/mpra_peak_tile.txt']
-        dfs = [pd.read_csv(f, delimiter='\t') for f in files]
-        data = self.normalize([('+' + x, y) for df in dfs for x, y in zip(df.trimmed_seq, df.RNA_exp_ave)])
+
+        def parse():
+            dfs = [pd.read_csv(f, delimiter='\t') for f in files]
+            return zip(*[('+' + x, y) for df in dfs for x, y in zip(df.trimmed_seq, df.RNA_exp_ave)])
+
+        dataset = environment.dataset.load('MPRA', files, parse)
+        data = self.normalize(dataset.items())
         shuffle(data)
         r = int(len(data) * validation)
         self.env = dict(data[r:])
         self.val = tuple(np.array(x) for x in zip(*data[:r]))
-        self.encode = environment.featurize.SeqEncoder(len(data[0][0]) - 1)
-        self.shape = self.encode.shape
+        self._store(self.Encoder(len(data[0][0]) - 1), dataset)
 
     def normalize(self, data):
         maxval = max([y for x, y in data])
@@ -311,3 +461,19 @@ class NormalizedMPRAEnv(MPRAEnv):
     def normalize(self, data):
         x_sort = [x for x, y in sorted(data, key=lambda d: d[1])]
         return [(x, i / len(x_sort)) for i, x in enumerate(x_sort)]
+
+
+def _encoded(Env, Encoder, *args, **kwargs):
+    env = Env.__new__(Env)
+    env.Encoder = Encoder
+    env.__init__(*args, **kwargs)
+    return env
+
+
+def RichEnv(Env):
+    '''DNA environment Env with sequences encoded by the 72 channel RichSeqEncoder,
+    e.g. RichEnv(GuideEnv) or RichEnv(GenericEnv("data/toy/20mer.csv")).
+    '''
+    if isinstance(Env, partial):
+        return partial(_encoded, Env.func, environment.featurize.RichSeqEncoder, *Env.args, **Env.keywords)
+    return partial(_encoded, Env, environment.featurize.RichSeqEncoder)
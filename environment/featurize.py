@@ -1,14 +1,26 @@
-import Bio.SeqUtils.MeltingTemp as Tm
 import Bio.SeqUtils
 import numpy as np
 import itertools
+import environment.cache
+import utils.timing
 
 def count_gc(s):
     return np.array([sum(i in 'GC' for i in s) / len(s)]  * (len(s) - 1))
 
 
+# Biopython's Tm_staluc(x, rna=False) of each nucleotide x, the melting temperature
+# encode_dna has always used (Tm_staluc is Tm_NN with 25 nM strands and 50 mM Na,
+# and was removed from later Biopython releases)
+NUCLEOTIDE_TM = dict(A=-437.6795329405884, T=-437.6795329405884, C=-277.9394433310362, G=-277.9394433310362)
+
+
+def nucleotide_tm(x):
+    '''Melting temperature of a nucleotide.'''
+    return NUCLEOTIDE_TM[x]
+
+
 def melting_temp(s):
-    return np.array([Tm.Tm_staluc(x, rna=False) for x in s[1:]]) / 1e3
+    return np.array([nucleotide_tm(x) for x in s[1:]]) / 1e3
 
 
 def molecular_weight(s):
@@ -37,41 +49,127 @@ def encode_dna(seq):
     melting temperature, molecular weight, and 3mer features 
     appended.
     '''
-    arr = np.zeros([len(seq) - 1, 72])
-    arr[:, 4] = 1 if seq[0] == '-' else 0
-    arr[:, 5] = count_gc(seq)
-    arr[:, 6] = melting_temp(seq)
-    arr[:, 7] = molecular_weight(seq)
-    arr[:, 8 :] = kmers(seq).T
-    arr[(np.arange(0, len(seq) - 1), ['ATCG'.index(i) for i in seq[1:]])] = 1
-    return arr
+    encoder = RichSeqEncoder(len(seq) - 1, cache=environment.cache.EncodingCache(0, np.uint8))
+    return encoder.expand(encoder.codes([seq]), np.float64)[0]
 
 
 class SeqEncoder:
 
     features = 5
+    lookup = np.full(256, -1, dtype=np.int8)
+    lookup[np.frombuffer(b'ATCG', dtype=np.uint8)] = np.arange(4)
 
-    def __init__(self, size):
-        '''Construct generic ATCG sequence encoder with sequence length.'''
-        self.cache = {}
+    def __init__(self, size, cache=None):
+        '''Construct generic ATCG sequence encoder with sequence length.
+        cache: encoding cache for single sequences, or None for the configured default
+        '''
+        self.cache = environment.cache.make(np.uint8) if cache is None else cache
         self.shape = (size, self.features)
 
     def __call__(self, seq):
         '''Convert DNA sequence [+-][ATCG]{N} into one-hot array
         with shape [N, 5] and +/- strand direction in the last channel.
         '''
-        if seq in self.cache:
-            idx = self.cache[seq]
-        else:
-            idx = np.array(['ATCG'.index(i) for i in seq[1:]])
-            self.cache[seq] = idx
-        arr = np.zeros([len(seq) - 1, self.features])
-        assert arr.shape == self.shape and seq[0] in '+-', 'bad sequence'
-        arr[:, 4] = 1 if seq[0] == '-' else 0
-        arr[(np.arange(0, len(seq) - 1), idx)] = 1
+        codes = self.cache.get(seq)
+        if codes is None:
+            codes = self.codes([seq])[0]
+            self.cache.put(seq, codes)
+        return self.expand(codes[None], np.float64)[0]
+
+    @utils.timing.phase('encode')
+    def batch(self, seqs, dtype=np.float32):
+        '''Convert list or array of DNA sequences [+-][ATCG]{N} into one
+        preallocated array with shape [len(seqs), N, 5] in a single pass.
+        '''
+        return self.expand(self.codes(seqs), dtype)
+
+    def codes(self, seqs):
+        '''Return compact uint8 codes with shape [len(seqs), N + 1] holding the
+        strand (1 for -) in the first column and base indices after it.
+        '''
+        raw = np.asarray(seqs, dtype=f'S{self.shape[0] + 2}')
+        raw = raw.view(np.uint8).reshape(len(raw), self.shape[0] + 2)
+        assert not raw[:, -1].any(), 'bad sequence' # longer than self.shape[0] + 1
+        raw = raw[:, :-1]
+        codes = self.lookup[raw].view(np.uint8)
+        strand = raw[:, 0]
+        assert (self.lookup[raw[:, 1:]] >= 0).all() and np.isin(strand, [ord('+'), ord('-')]).all(), 'bad sequence'
+        codes[:, 0] = strand == ord('-')
+        return codes
+
+    def unpack(self, arr):
+        '''Return codes from the array form of self.codes.'''
+        return arr
+
+    def expand(self, codes, dtype=np.float32):
+        '''Expand codes from self.codes into one-hot arrays.'''
+        arr = np.zeros([len(codes), *self.shape], dtype=dtype)
+        arr[:, :, 4] = codes[:, :1]
+        np.put_along_axis(arr, codes[:, 1:, None].astype(np.intp), 1, axis=2)
         return arr
 
 
+class RichSeqEncoder(SeqEncoder):
+    '''SeqEncoder with the GC frequency, melting temperature, molecular weight
+    and 3mer channels of encode_dna, computed for whole batches from per-nucleotide
+    lookup tables and rolling 3mer hashes.
+    '''
+
+    features = 72
+    k = 3
+
+    def __init__(self, size, cache=None):
+        super().__init__(size, cache)
+        self.tm = np.array([nucleotide_tm(x) for x in 'ATCG']) / 1e3
+        self.mw = np.array([Bio.SeqUtils.molecular_weight(x) for x in 'ATCG']) / 1e3
+
+    def expand(self, codes, dtype=np.float32):
+        '''Expand codes from self.codes into arrays of encode_dna features.'''
+        arr = super().expand(codes, dtype)
+        bases = codes[:, 1:].astype(np.intp)
+        arr[:, :, 5] = ((bases >= 2).sum(axis=1) / (self.shape[0] + 1))[:, None] # C or G
+        arr[:, :, 6] = self.tm[bases]
+        arr[:, :, 7] = self.mw[bases]
+        n = self.shape[0] - self.k + 1
+        if n > 0:
+            kmer = sum(4 ** (self.k - 1 - i) * bases[:, i : i + n] for i in range(self.k))
+            np.put_along_axis(arr[:, :n, 8:], kmer[:, :, None], 1, axis=2)
+        return arr
+
+
+class Substitutions:
+    '''Protein variants stored sparsely as lists of (position, residue index)
+    substitutions in compressed row form, packed into one int32 array
+    [n, offsets (n + 1), positions, residues] that can be memory-mapped.
+    '''
+
+    def __init__(self, packed):
+        n = int(packed[0])
+        m = int(packed[n + 1])
+        self.packed = packed
+        self.offsets = packed[1 : n + 2]
+        self.pos = packed[n + 2 : n + 2 + m]
+        self.aa = packed[n + 2 + m :]
+
+    @classmethod
+    def build(cls, offsets, pos, aa):
+        return cls(np.concatenate([[len(offsets) - 1], offsets, pos, aa]).astype(np.int32))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, rows):
+        '''Gather the substitution lists of the provided rows.'''
+        rows = np.arange(len(self))[rows]
+        start, counts = self.offsets[rows], self.offsets[rows + 1] - self.offsets[rows]
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        idx = np.repeat(start - offsets[:-1], counts) + np.arange(offsets[-1])
+        return Substitutions.build(offsets, self.pos[idx], self.aa[idx])
+
+    def __array__(self, dtype=None, copy=None):
+        return self.packed if dtype is None else self.packed.astype(dtype)
+
+
 class ProteinEncoder:
 
     aa = ['Aba', 'Ace', 'Acr', 'Ala', 'Aly', 'Arg', 'Asn', 'Asp', 'Cas', 
@@ -81,41 +179,115 @@ class ProteinEncoder:
             'Pca', 'Phe', 'Pro', 'Ptr', 'Sep', 'Ser', 'Thr', 'Tih', 'Tpo', 
             'Trp', 'Tyr', 'Unk', 'Val', 'Ycm', 'Sec', 'Pyl', 'Ter']
 
-    def __init__(self, base_seq):
-        '''Construct protein encoding function with base sequence to be modified.'''
+    def __init__(self, base_seq, cache=None):
+        '''Construct protein encoding function with base sequence to be modified.
+        cache: cache of parsed deltas, or None for the configured default
+        '''
         self.base_seq = []
         while len(base_seq):
             self.base_seq.append(base_seq[:3])
             base_seq = base_seq[3:]
         self.base_seq = np.array(self.base_seq)
         self.shape = (len(self.base_seq), len(self.aa))
-        self.cache = {}
+        self.cache = environment.cache.make(np.int32) if cache is None else cache
         self.aa_dict = {x: self.aa.index(x) for x in self.aa}
+        self.base = np.array([self.aa_dict[x] for x in self.base_seq], dtype=np.int32)
+        self.base_onehot = np.eye(len(self.aa), dtype=np.uint8)[self.base]
 
     def __call__(self, delta):
         '''Return one-hot encoding of base_seq, with the modifications
         in the hgvs_pro delta.
         '''
-        if delta in self.cache:
-            result = self.cache[delta]
-        else:
-            result = self._translate(delta)
-            self.cache[delta] = result 
-        arr = np.zeros([*self.base_seq.shape, len(self.aa)])
-        arr[np.arange(*self.base_seq.shape), [self.aa_dict[i] for i in result]] = 1.
+        return self.batch([delta], dtype=np.float64)[0]
+
+    @utils.timing.phase('encode')
+    def batch(self, deltas, dtype=np.float32):
+        '''Return one-hot encodings with shape [len(deltas), *self.shape] of
+        base_seq for each hgvs_pro delta, filling one preallocated array.
+        '''
+        return self.expand(self.codes(deltas), dtype)
+
+    def codes(self, deltas):
+        '''Parse the hgvs_pro deltas into Substitutions relative to base_seq.'''
+        subs = [self._parse(delta) for delta in deltas]
+        counts = np.array([len(pos) for pos, aa in subs], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        pos = np.concatenate([[], *[pos for pos, aa in subs]])
+        aa = np.concatenate([[], *[aa for pos, aa in subs]])
+        return Substitutions.build(offsets, pos, aa)
+
+    def unpack(self, arr):
+        '''Return Substitutions from the array form of self.codes.'''
+        return Substitutions(arr)
+
+    def expand(self, subs, dtype=np.float32):
+        '''Expand Substitutions by broadcasting the base one-hot encoding and
+        scattering the substituted residues.
+        '''
+        arr = np.empty([len(subs), *self.shape], dtype=dtype)
+        arr[:] = self.base_onehot
+        rows = np.repeat(np.arange(len(subs)), np.diff(subs.offsets))
+        arr[rows, subs.pos, self.base[subs.pos]] = 0
+        arr[rows, subs.pos, subs.aa] = 1
         return arr
 
-    def _translate(self, delta):
-        result = self.base_seq.copy()
+    def _parse(self, delta):
+        '''Return (positions, residue indices) substituted by the delta, with the
+        last substitution at a position taking precedence.
+        '''
+        result = self.cache.get(delta)
+        if result is not None:
+            return result[: len(result) // 2], result[len(result) // 2 :]
+        subs = {}
         if delta[:2] == 'p.':
-            delta = delta[2:]
-            delta = delta.replace('[', '').replace(']', '')
-            subs = delta.split(';')
-            for s in set(subs):
+            for s in delta[2:].replace('[', '').replace(']', '').split(';'):
                 if len(s) > 6 and s[-1] != '=':
-                    old = s[:3]
-                    new = s[-3:]
-                    idx = int(s[3:-3])
-                    assert result[idx - 1] == old, idx
-                    result[idx - 1] = new
-        return np.array(result)
+                    idx = int(s[3:-3]) - 1
+                    assert self.base_seq[idx] == s[:3], idx + 1
+                    subs[idx] = self.aa_dict[s[-3:]]
+        result = np.fromiter([*subs.keys(), *subs.values()], dtype=np.int32, count=2 * len(subs))
+        self.cache.put(delta, result)
+        return result[: len(subs)], result[len(subs) :]
+
+
+class SequenceStore:
+    '''Encodes a fixed set of sequences once, keeping their compact codes in one
+    contiguous array with a sequence to row index. Exposes the encoder interface,
+    gathering rows by index instead of re-encoding.
+    '''
+
+    def __init__(self, encoder, seqs, codes=None):
+        '''Encode seqs with encoder, which must provide codes and expand.
+        codes: precomputed (possibly memory-mapped) codes of seqs under encoder
+        '''
+        self.encoder = encoder
+        self.shape = encoder.shape
+        self.seqs = np.asarray(seqs)
+        self.index = {seq: i for i, seq in enumerate(self.seqs.tolist())}
+        self.codes = encoder.codes(seqs) if codes is None else codes
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def __call__(self, seq):
+        return self.batch([seq], dtype=np.float64)[0]
+
+    def rows(self, seqs):
+        '''Return row index of each sequence, or -1 for sequences not in the store.
+        Integer arrays are taken to be row indices (sequence IDs) already.
+        '''
+        if isinstance(seqs, np.ndarray) and seqs.dtype.kind in 'iu':
+            return seqs
+        return np.fromiter((self.index.get(seq, -1) for seq in seqs), dtype=np.intp, count=len(seqs))
+
+    @utils.timing.phase('encode')
+    def batch(self, seqs, dtype=np.float32):
+        '''Gather encodings of seqs with shape [len(seqs), *self.shape], encoding
+        any sequences not in the store.
+        '''
+        rows = self.rows(seqs)
+        missing = rows < 0
+        arr = self.encoder.expand(self.codes[np.where(missing, 0, rows)], dtype)
+        if missing.any():
+            arr[missing] = self.encoder.batch([seq for seq, m in zip(seqs, missing) if m], dtype)
+        return arr
@@ -1,5 +1,52 @@
 import time
 import numpy as np
+import utils.timing
+import utils.memory
+
+class _Ranked:
+    '''Multiset of sequences drawn from a fixed labeled universe, kept in a
+    Fenwick tree over label rank so that insertion, removal and the sum of
+    the k largest labels present each cost O(log N).
+    '''
+
+    def __init__(self, labels):
+        keys = list(labels.keys())
+        values = np.array([labels[x] for x in keys], dtype=np.float64)
+        order = np.argsort(-values, kind='stable')
+        self.values = values[order].tolist() # labels in descending order
+        self.rank = {keys[i]: r + 1 for r, i in enumerate(order)}
+        self.counts = [0] * (len(keys) + 1)
+        self.sums = [0.] * (len(keys) + 1)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, key, sign=1):
+        '''Insert key, or remove it if sign is -1.'''
+        i = self.rank[key]
+        value = sign * self.values[i - 1]
+        self.size += sign
+        while i < len(self.counts):
+            self.counts[i] += sign
+            self.sums[i] += value
+            i += i & -i
+
+    def remove(self, key):
+        self.add(key, -1)
+
+    def top(self, k):
+        '''Return sum of the k largest labels present.'''
+        pos, total = 0, 0.
+        step = 1 << (len(self.counts) - 1).bit_length()
+        while step:
+            if pos + step < len(self.counts) and self.counts[pos + step] <= k:
+                pos += step
+                k -= self.counts[pos]
+                total += self.sums[pos]
+            step >>= 1
+        return total
+
 
 def Regret(top):
     '''Computes cumulative difference between sum of the labels of the
@@ -11,11 +58,21 @@ def Regret(top):
     class Metric:
         def __init__(self, prior):
             self.history = 0
+            self.unseen = None
+            self.selected = []
 
         def __call__(self, seen, unseen, selected):
+            if self.unseen is not None:
+                for x in self.selected:
+                    self.unseen.remove(x)
+            if self.unseen is None or len(self.unseen) != len(unseen):
+                self.unseen = _Ranked(unseen)
+                for x in unseen:
+                    self.unseen.add(x)
+            self.selected = list(selected)
             to_check = int(top * len(selected))
             r = sum(sorted(unseen[x] for x in selected)[-to_check:])
-            r_star = sum(sorted(unseen.values())[-to_check:])
+            r_star = self.unseen.top(to_check or len(unseen))
             self.history += r_star - r
             return self.history
 
@@ -31,12 +88,17 @@ def Score(top):
 
     class Metric:
         def __init__(self, prior):
-            pass
+            self.seen = None
 
         def __call__(self, seen, unseen, selected):
-            to_check = int(top * (len(seen) + len(selected)))
-            to_score = list(seen.values()) + [unseen[x] for x in selected]
-            return np.array(sorted(to_score)[-to_check:]).mean()
+            if self.seen is None or len(self.seen) != len(seen):
+                self.seen = _Ranked({**seen, **unseen})
+                for x in seen:
+                    self.seen.add(x)
+            for x in selected:
+                self.seen.add(x)
+            to_check = int(top * len(self.seen)) or len(self.seen)
+            return self.seen.top(to_check) / to_check if to_check else np.nan
 
     return Metric
 
@@ -50,14 +112,22 @@ def Discovery(top):
     class Metric:
         def __init__(self, prior):
             self.best = None
+            self.size = None
+            self.found = 0
 
         def __call__(self, seen, unseen, selected):
             if self.best is None:
                 all_seqs = {**seen, **unseen}
+                keys = list(all_seqs.keys())
                 num_top = int(top * len(all_seqs))
-                self.best = set(sorted(all_seqs.keys(), key=lambda x: all_seqs[x])[-num_top:])
-            to_check = list(seen.keys()) + list(selected)
-            return sum(x in self.best for x in to_check) / len(self.best)
+                order = np.argsort([all_seqs[x] for x in keys], kind='stable')
+                self.best = {keys[i] for i in order[-num_top:]}
+            if self.size != len(seen):
+                self.found = sum(x in self.best for x in seen)
+            new = sum(x in self.best for x in selected)
+            self.size = len(seen) + len(selected)
+            self.found += new
+            return self.found / len(self.best)
 
     return Metric
             
@@ -74,6 +144,37 @@ def Time():
 
     return Metric
 
+def Memory(peak=False):
+    '''Measures resident set size of the run's process in MB at each timestep,
+    or its peak so far if peak.
+    '''
+
+    class Metric:
+        def __init__(self, prior):
+            pass
+
+        def __call__(self, seen, unseen, selected):
+            return max(utils.memory.peak_rss(), utils.memory.rss()) if peak else utils.memory.rss()
+
+    return Metric
+
+def Phase(name):
+    '''Measures seconds spent in a phase of each timestep: act, observe, fit,
+    predict, embed, encode, acquisition or diversity. Phases are timed inclusively
+    (fit within observe, and encoding in fit within it), but encoding done in the
+    background during predict or embed only counts towards them. Metrics, whose
+    time is only known after evaluation, is reported for the previous timestep.
+    '''
+
+    class Metric:
+        def __init__(self, prior):
+            pass
+
+        def __call__(self, seen, unseen, selected):
+            return (utils.timing.last if name == 'metrics' else utils.timing.phases).get(name, 0.)
+
+    return Metric
+
 def Improvement():
     '''Measures selections until improved sequence found from start sequences.'''
 
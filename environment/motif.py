@@ -1,59 +1,88 @@
 import numpy as np
-from random import *
 
-def make_motif(sz, comp):
+BASES = np.frombuffer(b'ATCG', dtype=np.uint8)
+STRANDS = np.frombuffer(b'+-', dtype=np.uint8)
+
+def make_motif(sz, comp, rng=np.random):
     '''Get Cauchy sampled PWM of provided size and complexity from (0, 1].'''
-    arr = np.abs(np.random.normal(size=4 * sz).reshape([sz, 4])) ** (1 / comp)
+    arr = np.abs(rng.normal(size=4 * sz).reshape([sz, 4])) ** (1 / comp)
     return arr / arr.sum(axis=1)[:, np.newaxis]
 
-def seq(m):
+def sample(m, n, rng=np.random, idx=None):
+    '''Sample n sequences from PWM m, or from the PWM m[idx[i]] for the ith sequence
+    if m is a stack of PWMs, by looking up uniform draws in the cumulative
+    probabilities of each position. Returns [n, len] array of indices into 'ATCG'.
+    '''
+    cdf = np.cumsum(m, axis=-1)[..., :-1]
+    if idx is not None:
+        cdf = cdf[idx]
+    u = rng.random_sample([n, cdf.shape[-2], 1])
+    return (u >= cdf).sum(axis=-1, dtype=np.uint8)
+
+def invert(codes):
+    '''Complement of sequences given as indices into 'ATCG'.'''
+    return codes ^ 1
+
+def strings(codes, strands=None):
+    '''Convert [n, len] array of indices into 'ATCG' to sequence strings, prefixed
+    with '+' or '-' by the boolean strands array if provided.
+    '''
+    chars = BASES[codes]
+    if strands is not None:
+        chars = np.concatenate([STRANDS[np.asarray(strands, dtype=np.uint8)][:, None], chars], axis=1)
+    chars = np.ascontiguousarray(chars)
+    return chars.view(f'S{chars.shape[1]}')[:, 0].astype(str).tolist()
+
+def seq(m, rng=np.random):
     '''Sample a sequence s from PWM m.'''
-    return ''.join(np.random.choice(list('ATCG'), p=p) for p in m)
+    return strings(sample(m, 1, rng))[0]
 
-def uniform(n):
-    '''Return uniformly sampled sequence of length m.'''
-    return choice('+-') + seq(np.array([[0.25] * 4] * (n - 1)))
+def uniform(n, count=None, rng=np.random):
+    '''Return uniformly sampled stranded sequence of length n, or list of count of them.'''
+    codes = rng.randint(4, size=[count or 1, n - 1], dtype=np.uint8)
+    seqs = strings(codes, rng.randint(2, size=count or 1))
+    return seqs if count is not None else seqs[0]
 
-def pad(D, n=30000):
+def pad(D, n=30000, rng=np.random):
     '''Add zero-label random sequences to D until |D| = n.'''
-    sz = len(D[0][0])
-    while len(D) < n:
-        D.append((uniform(sz), 0.))
+    if len(D) < n:
+        D += [(s, 0.) for s in uniform(len(D[0][0]), n - len(D), rng)]
 
-@np.vectorize
-def invert(s):
-    return 'TAGC'['ATCG'.index(s)]
-
-def gen_seq(length, motifs, lam, scale):
-    '''Make sequence of provided length given motifs, mean of poisson 
+def gen_seqs(count, length, motifs, lam, scale, rng=np.random):
+    '''Make count sequences of provided length given motifs, mean of poisson
     distribution for number of motifs in any sequence, and (mu, sigma)
     score distribution pairs for each motif.
-    Return the sequence, and the score determined by the quadratic function
+    Return the sequences, and the scores determined by the quadratic function
     on motif counts specified by the scale matrix.
     '''
-    s = np.array([choice('ATCG') for _ in range(length)])
-    r = np.zeros(shape=[length + 1 - len(seq(motifs[0]))])
-    num = min(1 + np.random.poisson(lam), int(3 * lam + 1))
-    features = np.zeros([len(motifs)])
-    for i in range(num):
-        idx, motif = choice([*enumerate(motifs)])
-        m = np.array(list(seq(motif)))
-        j = randrange(length + 1 - len(m))
-        s[j : j + len(m)] = m
-        features[idx] += 1
-    sign = choice('+-')
-    value = np.random.normal(scale[:, 0], scale[:, 1])
-    return sign + ''.join(s if sign == '+' else invert(s)), 1 / (1 + np.exp(-np.dot(value, features) / num))
-
-def make_data(batch, lam=1., N=100, comp=0.5, var=0.5):
+    motifs = np.asarray(motifs)
+    s = rng.randint(4, size=[count, length]).astype(np.uint8)
+    num = np.minimum(1 + rng.poisson(lam, size=count), int(3 * lam + 1))
+
+    # insert motifs sampled from random PWMs at random positions, later ones overwriting earlier ones
+    rows = np.repeat(np.arange(count), num)
+    idx = rng.randint(len(motifs), size=len(rows))
+    cols = rng.randint(length + 1 - motifs.shape[1], size=len(rows))[:, None] + np.arange(motifs.shape[1])
+    s[rows[:, None], cols] = sample(motifs, len(rows), rng, idx)
+
+    # score each sequence with one draw per distinct motif it contains, weighted by its count
+    pairs, features = np.unique(rows * len(motifs) + idx, return_counts=True)
+    value = rng.normal(scale[pairs % len(motifs), 0], scale[pairs % len(motifs), 1])
+    total = np.bincount(pairs // len(motifs), weights=value * features, minlength=count)
+
+    strands = rng.randint(2, size=count).astype(bool)
+    s[strands] = invert(s[strands])
+    return strings(s, strands), 1 / (1 + np.exp(-total / num))
+
+def make_data(batch, lam=1., N=100, comp=0.5, var=0.5, rng=np.random):
     '''Return batch datapoints, each with lam + 1 motifs on average (at least 1).
     Uses a pool of N motifs across the data. Comp
     scales directly with the randomness of the PWMs, var
     is the max variance of scores corresponding to sequences
     with a singe given motif.
     '''
-    motifs = [make_motif(10, comp) for _ in range(N)]
-    scale = np.array([[random() - 1 / 2, random() * var] for _ in motifs])
-    data = [gen_seq(50, motifs, lam, scale) for k in range(batch)]
-    shuffle(data)
-    return data
+    motifs = [make_motif(10, comp, rng) for _ in range(N)]
+    scale = np.stack([rng.random_sample(N) - 1 / 2, rng.random_sample(N) * var], axis=1)
+    seqs, scores = gen_seqs(batch, 50, motifs, lam, scale, rng)
+    order = rng.permutation(batch)
+    return [(seqs[i], scores[i]) for i in order]
@@ -7,28 +7,31 @@ import torch.functional as F
 from models.featurizer import Featurizer
 from sklearn.cluster import KMeans, AffinityPropagation
 from sklearn.metrics import silhouette_score
+import utils.timing
 
 
 class Bucketer:
     '''Buckets and samples from embedded sequences with Thompson sampling.'''
 
-    def fit(self, seqs, scores, epochs):
+    @utils.timing.phase('fit')
+    def fit(self, seqs, scores, epochs, **schedule):
         '''Fits model to observed labeled sequences. Should be
         called with all labeled sequences seen so far at each
         time step.
         '''
         self.X = seqs[:]
         self.Y = scores[:]
-        self.embed.fit(self.X, self.Y, epochs)
+        self.embed.fit(self.X, self.Y, epochs, **schedule)
 
+    @utils.timing.phase('acquisition')
     def sample(self, pts, n):
         '''Thompson sample sequences.
         pts: sequences to sample from
         n: number of sequences to sample
         '''
-        pts = pts[:]
         seen_em = list(self.embed(self.X)) if len(self.X) else [] # embedding of seen sequences
-        pts_em = list(self.embed(pts)) # embedding of unlabeled sequences
+        pts_em, predicted = self.embed.forward(pts, features=False) # embedding and predicted labels of unlabeled sequences
+        pts_em = list(pts_em)
 
         # create buckets containing labels of seen sequences using k-means
         # of embeddings of both seen and unseen sequences
@@ -78,33 +81,31 @@ class Bucketer:
         # select n sequences to return
         selections = []
         pts_buckets = clustering.predict(pts_em) # buckets of all unlabeled sequences
-        scores = self.embed.predict(pts) # predicted labels for greedy step
+        available = np.ones([len(pts)], dtype=bool) # mask of sequences not yet selected
+        remaining = np.bincount(pts_buckets, minlength=k) # unselected sequences in each bucket
         
         for i in range(n):
 
             # 1. Thompson sample a bucket by sampling from each conjugate dist and taking max
             # 2. get the unlabeled sequences in it and their predictions
             dists = sigma_dists if i / n < self.rho else mu_dists
-            samples = np.array([dist() if bucket_idx in pts_buckets else -np.inf
+            samples = np.array([dist() if remaining[bucket_idx] else -np.inf
                                         for bucket_idx, dist in enumerate(dists)])
-            sampled_idx = np.argmax(samples) == pts_buckets
-            sampled_pts = np.array(pts)[sampled_idx]
-            sampled_preds = np.array(scores)[sampled_idx]
+            sampled_idx = np.flatnonzero(available & (np.argmax(samples) == pts_buckets))
 
             # e-greedily take best predicted sequence in bucket
             if np.random.rand() < self.eps:
-                selections.append(np.random.choice(sampled_pts))
+                selections.append(np.random.choice(sampled_idx))
             else:
-                selections.append(sampled_pts[np.argmax(sampled_preds)])
+                selections.append(sampled_idx[np.argmax(predicted[sampled_idx])])
 
             # remove sequence
-            del pts_em[pts.index(selections[-1])]
-            removal = np.arange(scores.shape[0]) != pts.index(selections[-1])
-            pts_buckets = pts_buckets[removal]
-            scores = scores[removal]
-            del pts[pts.index(selections[-1])]
+            available[selections[-1]] = False
+            remaining[pts_buckets[selections[-1]]] -= 1
 
-        return selections
+        if isinstance(pts, np.ndarray):
+            return pts[selections]
+        return [pts[i] for i in selections]
 
     def __init__(self, encoder, dim, shape, alpha=5e-4,
                     prior=(0.5, 10, 1, 1), eps=0., rho=0., k=100, minibatch=100):
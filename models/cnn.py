@@ -4,7 +4,10 @@ import os, sys
 import torch
 from torch import nn
 import torch.functional as F
+import models.trunk
+import utils.engine
 import utils.model
+import utils.timing
 
 
 class CNN:
@@ -16,46 +19,36 @@ class CNN:
 
             def __init__(self):
                 super().__init__()
-                conv = self.conv = [nn.Conv1d(shape[1], 64, 7, stride=1, padding=3),
-                    nn.Conv1d(64, 64, 5, stride=1, padding=2),
-                    nn.Conv1d(64, 32, 3, stride=1, padding=1)]
-                self.conv_layers = nn.Sequential(
-                    conv[0], nn.ReLU(), conv[1], nn.ReLU(),
-                    conv[2], nn.ReLU()) 
-                fc = self.fc = [nn.Linear(32 * shape[0], 100), nn.Linear(100, 100), nn.Linear(100, 1)]
+                self.trunk = models.trunk.ConvTrunk(*shape)
+                fc = self.fc = [nn.Linear(self.trunk.features, 100), nn.Linear(100, 100), nn.Linear(100, 1)]
                 self.fc_layers = nn.Sequential(
                     fc[0], nn.ReLU(), nn.Dropout(0.5), fc[1], nn.ReLU(), 
                     nn.Dropout(0.5), fc[2], nn.Sigmoid())
             
             def forward(self, x):
-                filtered = self.conv_layers(x.permute(0, 2, 1))
-                return torch.squeeze(self.fc_layers(filtered.reshape(filtered.shape[0], -1)), dim=1)
+                return torch.squeeze(self.fc_layers(self.trunk(x)), dim=1)
             
             def l2(self):
-                return sum(torch.sum(param ** 2) for c in self.conv for param in c.parameters())
+                return self.trunk.l2()
 
         self.model = Model().to(self.device)
 
-    def fit(self, seqs, scores, epochs):
+    @utils.timing.phase('fit')
+    def fit(self, seqs, scores, epochs, **schedule):
         self.model.train()
-        D = list(zip([self.encode(x) for x in seqs], scores))
-        M = len(D) // self.minibatch + bool(len(D) % self.minibatch)
-        for ep in range(epochs):
-            shuffle(D)
-            for mb in range(M):
-                X, Y = map(lambda t: torch.tensor(t).to(self.device).float(), 
-                                zip(*D[mb * self.minibatch : (mb + 1) * self.minibatch]))
-                loss = torch.sum((Y - self.model(X)) ** 2) + self.lam * self.model.l2()
-                self.opt.zero_grad()
-                loss.backward()
-                nn.utils.clip_grad_norm_(self.model.parameters(), 1)
-                self.opt.step()
+        D = utils.model.fit_data(self, seqs, scores, **schedule)
+        batches = utils.model.Schedule(len(D), epochs, self.minibatch, **schedule)
+        for idx in batches:
+            X, Y = D[idx]
+            loss = torch.sum((Y - self.model(X)) ** 2) + self.lam * self.model.l2()
+            utils.engine.step(self.opt, loss, self.model.parameters())
+            batches.update(loss)
     
-    @utils.model.batch
-    def predict(self, seqs):
+    @utils.timing.phase('predict')
+    @utils.model.inference
+    def predict(self, X):
         self.model.eval()
-        return self.model(torch.tensor(
-            [self.encode(seq) for seq in seqs]).to(self.device).float()).detach().cpu().numpy()
+        return self.model(X).cpu().numpy()
     
     def __call__(self, seqs):
         return self.predict(seqs)
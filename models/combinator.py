@@ -7,6 +7,7 @@ import torch.functional as F
 from models.featurizer import Featurizer
 from sklearn.cluster import KMeans, AffinityPropagation
 from sklearn.metrics import silhouette_score
+import utils.timing
 
 
 class Combinator:
@@ -15,15 +16,17 @@ class Combinator:
     conjugate with MCMC.
     '''
 
-    def fit(self, seqs, scores, epochs):
+    @utils.timing.phase('fit')
+    def fit(self, seqs, scores, epochs, **schedule):
         '''Fits model to observed labeled sequences. Should be
         called with all labeled sequences seen so far at each
         time step.
         '''
         self.X = seqs[:]
         self.Y = scores[:]
-        self.embed.fit(self.X, self.Y, epochs)
+        self.embed.fit(self.X, self.Y, epochs, **schedule)
 
+    @utils.timing.phase('diversity')
     def _sample_action(self, m, k, conj_dists):
         '''Sample from conjugates over buckets, then approximate bucket distribution maximizing metric
         induced by rho with MCMC.
@@ -78,14 +81,15 @@ class Combinator:
         return mcmc(self.iters)
 
 
+    @utils.timing.phase('acquisition')
     def sample(self, pts, m):
         '''Thompson sample sequences.
         pts: sequences to sample from
         m: number of sequences to sample
         '''
-        pts = pts[:]
         seen_em = list(self.embed(self.X)) if len(self.X) else [] # embedding of seen sequences
-        pts_em = list(self.embed(pts)) # embedding of unlabeled sequences
+        pts_em, predicted = self.embed.forward(pts, features=False) # embedding and predicted labels of unlabeled sequences
+        pts_em = list(pts_em)
 
         # create buckets containing labels of seen sequences using k-means
         # of embeddings of both seen and unseen sequences
@@ -132,35 +136,31 @@ class Combinator:
         # from the conjugate distributions for each sequence
         selections = []
         pts_buckets = clustering.predict(pts_em) # buckets of all unlabeled sequences
-        scores = self.embed.predict(pts) # predicted labels for greedy step
+        available = np.ones([len(pts)], dtype=bool) # mask of sequences not yet selected
+        remaining = np.bincount(pts_buckets, minlength=k) # unselected sequences in each bucket
 
         for _ in range(m):
             # sample bucket randomly from sampled bucket distribution given fixed sample from conjugates
             bucket_dist = np.array(self._sample_action(m, k, conj_dists))
-            for i in range(k):
-                if i not in pts_buckets:
-                    bucket_dist[i] = 0
+            bucket_dist[remaining == 0] = 0
             if (bucket_dist == 0).all():
-                bucket_dist[np.random.choice(pts_buckets)] = m
+                bucket_dist[np.random.choice(pts_buckets[available])] = m
             bucket_idx = np.random.choice(k, p=bucket_dist / bucket_dist.sum())
-            sampled_idx = bucket_idx == pts_buckets
-            sampled_pts = np.array(pts)[sampled_idx]
-            sampled_preds = np.array(scores)[sampled_idx]
+            sampled_idx = np.flatnonzero(available & (bucket_idx == pts_buckets))
 
             # e-greedily take best predicted sequence in bucket
             if np.random.rand() < self.eps:
-                selections.append(np.random.choice(sampled_pts))
+                selections.append(np.random.choice(sampled_idx))
             else:
-                selections.append(sampled_pts[np.argmax(sampled_preds)])
+                selections.append(sampled_idx[np.argmax(predicted[sampled_idx])])
 
             # remove sequence
-            del pts_em[pts.index(selections[-1])]
-            removal = np.arange(scores.shape[0]) != pts.index(selections[-1])
-            pts_buckets = pts_buckets[removal]
-            scores = scores[removal]
-            del pts[pts.index(selections[-1])]
+            available[selections[-1]] = False
+            remaining[pts_buckets[selections[-1]]] -= 1
 
-        return selections
+        if isinstance(pts, np.ndarray):
+            return pts[selections]
+        return [pts[i] for i in selections]
 
     def __init__(self, encoder, dim, shape, alpha=5e-4, prior=(0.5, 10, 1, 1), eps=0., 
                         rho=1.0, k=100, iters=1000, approx=200, temp=0.01, delta=1, minibatch=100):
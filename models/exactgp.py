@@ -1,5 +1,6 @@
 import gpytorch
 import torch
+import utils.timing
 
 class ExactGPModel(gpytorch.models.ExactGP):
     '''Exact GP model.'''
@@ -25,6 +26,7 @@ class FittedGP:
         self.likelihood.train()
         self.optim = torch.optim.Adam(self.model.parameters(), lr=0.1)
         
+    @utils.timing.phase('predict')
     def predict(self, X):
         self.model.eval()
         with torch.no_grad(), gpytorch.settings.fast_pred_var():
@@ -37,6 +39,7 @@ class FittedGP:
             result = self.model(torch.tensor(X).to(self.device).float())
             return result.mean.data.cpu().numpy(), result.covariance_matrix.data.cpu().numpy()
 
+    @utils.timing.phase('fit')
     def fit(self, epochs=50):
         self.model.train()
         mll = gpytorch.mlls.ExactMarginalLogLikelihood(self.likelihood, self.model)
@@ -8,15 +8,17 @@ from models.featurizer import Featurizer
 from scipy.spatial.distance import pdist, cdist, squareform
 from models.embed import *
 import utils.model
+import utils.timing
 
 
 class GaussianProcess:
     '''Fits gaussian process model to sequence data using a deep kernel function.'''
 
-    def fit(self, seqs, scores, epochs):
+    @utils.timing.phase('fit')
+    def fit(self, seqs, scores, epochs, **schedule):
         self.X = seqs[:]
         self.Y = scores[:]
-        self.embed.fit(self.X, self.Y, epochs)
+        self.embed.fit(self.X, self.Y, epochs, **schedule)
 
     def mll(self, epochs=50):
         '''Fit RBF kernel parameters by minimizing -mll.'''
@@ -32,6 +34,7 @@ class GaussianProcess:
             (-mll).backward()
             self.opt.step()
 
+    @utils.timing.phase('acquisition')
     @utils.model.batch
     def interpolate(self, x):
         '''Given observed points in (self.X, self.Y),
@@ -51,6 +54,7 @@ class GaussianProcess:
             torch.eye(len(X)).to(self.embed.device).double() * self.eps) @ (T(Y)[:, None] - self.mu))
         return mu.detach().cpu().numpy()
 
+    @utils.timing.phase('acquisition')
     @utils.model.batch
     def uncertainty(self, x, prior=[]):
         '''Given observed points in self.X, fits gaussian
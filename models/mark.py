@@ -5,7 +5,10 @@ import torch
 from torch import nn
 import torch.functional as F
 from abc import ABC, abstractmethod
+import models.trunk
+import utils.engine
 import utils.model
+import utils.timing
 
 
 class MarkEmbedding:
@@ -17,70 +20,56 @@ class MarkEmbedding:
 
             def __init__(self):
                 super().__init__()
-                conv = self.conv = [nn.Conv1d(shape[1], 64, 7, stride=1, padding=3),
-                    nn.Conv1d(64, 64, 5, stride=1, padding=2),
-                    nn.Conv1d(64, 32, 3, stride=1, padding=1)]
-                self.conv_layers = nn.Sequential(
-                    conv[0], nn.ReLU(), conv[1], nn.ReLU(),
-                    conv[2], nn.ReLU())
+                self.trunk = models.trunk.ConvTrunk(*shape)
                 self.fc_layers = nn.Sequential(
-                    nn.Linear(32 * shape[0], 100), nn.ReLU(), nn.Linear(100, 1 + dim), nn.Sigmoid())
+                    nn.Linear(self.trunk.features, 100), nn.ReLU(), nn.Linear(100, 1 + dim), nn.Sigmoid())
 
             def forward(self, x):
-                filtered = self.conv_layers(x.permute(0, 2, 1))
-                fc = self.fc_layers(filtered.reshape(filtered.shape[0], -1))
+                fc = self.fc_layers(self.trunk(x))
                 return fc[:, 0]
 
             def embed(self, x):
-                filtered = self.conv_layers(x.permute(0, 2, 1))
-                fc = self.fc_layers(filtered.reshape(filtered.shape[0], -1))
+                fc = self.fc_layers(self.trunk(x))
                 return fc[:, 1:]
 
             def l2(self):
-                return sum(torch.sum(param ** 2) for c in self.conv for param in c.parameters())
+                return self.trunk.l2()
 
         return Model()
 
     def _make_net(self, alpha, opt, shape, dim):
         self.model = self.make_model(shape, dim).to(self.device)
 
-    def fit(self, seqs, scores, epochs, markers):
+    @utils.timing.phase('fit')
+    def fit(self, seqs, scores, epochs, markers, **schedule):
         '''Refit embedding with labeled sequences.'''
         self.model.train()
-        markers = np.array([[self.encode(x)] for x in markers])
-        D = list(zip([self.encode(x) for x in seqs], scores))
-        M = len(D) // self.minibatch + bool(len(D) % self.minibatch)
-        for ep in range(epochs):
-            shuffle(D)
-            for mb in range(M):
-                X, Y = map(lambda t: torch.tensor(t).to(self.device), 
-                            zip(*D[mb * self.minibatch : (mb + 1) * self.minibatch]))
-                idx_a, idx_b = sample(list(range(len(markers))), 2)
-                mark_a = markers[idx_a]
-                mark_b = markers[idx_b]
-                loss = torch.mean((Y - self.model(X.float())) ** 2) \
-                        + self.lam * self.model.l2() \
-                        + torch.clamp(self.clip - \
-                            torch.norm(self.model.embed(torch.tensor(mark_a).float().to(self.device)) \
-                            - self.model.embed(torch.tensor(mark_b).float().to(self.device)), 2), min=0)
-                self.opt.zero_grad()
-                loss.backward()
-                nn.utils.clip_grad_norm_(self.model.parameters(), 1)
-                self.opt.step()
+        markers = torch.from_numpy(self.encode.batch(markers)[:, None]).float().to(self.device)
+        D = utils.model.fit_data(self, seqs, scores, **schedule)
+        batches = utils.model.Schedule(len(D), epochs, self.minibatch, **schedule)
+        for idx in batches:
+            X, Y = D[idx]
+            idx_a, idx_b = sample(list(range(len(markers))), 2)
+            mark_a = markers[idx_a]
+            mark_b = markers[idx_b]
+            loss = torch.mean((Y - self.model(X)) ** 2) \
+                    + self.lam * self.model.l2() \
+                    + torch.clamp(self.clip - \
+                        torch.norm(self.model.embed(mark_a) - self.model.embed(mark_b), 2), min=0)
+            utils.engine.step(self.opt, loss, self.model.parameters())
+            batches.update(loss)
 
-    @utils.model.batch
-    def predict(self, seqs):
+    @utils.timing.phase('predict')
+    @utils.model.inference
+    def predict(self, X):
         self.model.eval()
-        return self.model(torch.tensor([self.encode(seq) for seq in seqs]).float()
-                    .to(self.device)).detach().cpu().numpy()
+        return self.model(X).cpu().numpy()
     
-    @utils.model.batch
-    def __call__(self, seqs):
+    @utils.model.inference
+    def __call__(self, X):
         '''Embed list of sequences.'''
         self.model.eval()
-        return self.model.embed(
-                torch.tensor([self.encode(seq) for seq in seqs])
-                .float().to(self.device)).detach().cpu().numpy()
+        return self.model.embed(X).cpu().numpy()
 
     def __init__(self, encoder, dim, shape, alpha=1e-3, lam=0, clip=0.2, minibatch=100):
         '''Embeds sequences encoded by encoder with learning rate alpha and l2 regularization lambda,
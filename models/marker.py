@@ -8,11 +8,13 @@ from models.mark import MarkEmbedding
 from models.featurizer import Featurizer
 from sklearn.cluster import KMeans, AffinityPropagation
 from sklearn.metrics import silhouette_score
+import utils.timing
 
 
 class Marker:
     '''Selects mark sequences and samples from embedded sequences with Thompson sampling.'''
 
+    @utils.timing.phase('fit')
     def fit(self, seqs, scores, epochs):
         '''Fits model to observed labeled sequences. Should be
         called with all new labeled sequences seen so far at each
@@ -31,6 +33,7 @@ class Marker:
     def _closest(self, X):
         return np.argmin(np.linalg.norm(self.embed(self.markers)[None, :, :] - self.embed(X)[:, None, :], axis=2), axis=1)
 
+    @utils.timing.phase('acquisition')
     def sample(self, pts, n):
         '''Thompson sample sequences.
         pts: sequences to sample from
@@ -126,9 +129,6 @@ class Marker:
         self.k = k
         self.seen = {x: y for x, y in zip(X, Y)}
 
-        def distfrom(x, markers):
-            return min(np.abs(encoder(x) - encoder(m)).sum() for m in markers)
-
         # Compute initial marker sequences in the top 10%
         Y_cut = sorted(Y)[int(0.9*len(Y))]
         idx = np.argmax(Y)
@@ -137,11 +137,13 @@ class Marker:
         Y = np.delete(Y, idx)
         X_pos = X[Y > Y_cut]
         Y_pos = Y[Y > Y_cut]
+        E_pos = encoder.batch(X_pos)
+        dist = np.full(len(X_pos), np.inf) # distance from each candidate to closest marker
         for i in range(1, k):
-            idx = max(range(len(X_pos)), key=lambda x: distfrom(X_pos[x], self.markers))
+            dist = np.minimum(dist, np.abs(E_pos - encoder.batch(self.markers[-1:])).sum(axis=(1, 2)))
+            idx = np.argmax(dist)
             self.markers.append(X_pos[idx])
-            X_pos = np.delete(X_pos, idx)
-            Y_pos = np.delete(Y_pos, idx)
+            X_pos, Y_pos, E_pos, dist = (np.delete(a, idx, axis=0) for a in (X_pos, Y_pos, E_pos, dist))
         
         self.embed.fit(X, Y, epochs, self.markers)
         self.pred.fit(X, Y, epochs)
@@ -8,15 +8,17 @@ from torch.distributions import *
 from models.autoencoder import Autoencoder
 from scipy.spatial.distance import pdist, cdist, squareform
 import utils.model
+import utils.timing
 
 
 class SparseGaussianProcess:
     '''Fits gaussian process model using induced points.'''
 
-    def fit(self, seqs, scores, epochs):
+    @utils.timing.phase('fit')
+    def fit(self, seqs, scores, epochs, **schedule):
         self.X = seqs[:]
         self.Y = scores[:]
-        self.embed.fit(self.X, self.Y, epochs)
+        self.embed.fit(self.X, self.Y, epochs, **schedule)
 
     def _induce(self, X, M, Y, X_pred):
         n = len(X)
@@ -56,6 +58,7 @@ class SparseGaussianProcess:
                 @ K_star.permute(1, 0)).transpose(0, 1).view(K_star.size(0), K_star.size(1), 1)).view(X_pred.size(0)) + sig.exp().add(1).log()
         return mu, sig_sq
 
+    @utils.timing.phase('acquisition')
     @utils.model.batch
     def interpolate(self, x):
         '''Given observed points in (self.X, self.Y),
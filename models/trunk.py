@@ -0,0 +1,40 @@
+import torch
+from torch import nn
+import torch.nn.functional as F
+import utils.engine
+
+
+class ConvTrunk(nn.Module):
+    '''Three 1D convolutions shared by the sequence models, mapping encoded
+    sequences of shape (length, channels) to 32 * length features. Runs with
+    the utils.engine backend and precision configured when it is built.
+    '''
+
+    def __init__(self, length, channels):
+        super().__init__()
+        self.features = 32 * length
+        conv = self.conv = [nn.Conv1d(channels, 64, 7, stride=1, padding=3),
+            nn.Conv1d(64, 64, 5, stride=1, padding=2),
+            nn.Conv1d(64, 32, 3, stride=1, padding=1)]
+        self.conv_layers = nn.Sequential(
+            conv[0], nn.ReLU(), conv[1], nn.ReLU(),
+            conv[2], nn.ReLU())
+        self.__dict__['_run'] = utils.engine.compile(self.conv_layers) # not a submodule, so not in state dicts
+
+    def forward(self, x):
+        with utils.engine.autocast(x):
+            filtered = self._run(x.permute(0, 2, 1).float())
+        return filtered.float().reshape(filtered.shape[0], -1)
+
+    def l2(self):
+        return sum(torch.sum(param ** 2) for c in self.conv for param in c.parameters())
+
+
+def conv(w, x):
+    '''Apply ConvTrunk with weights and biases w (in layer order) to x.'''
+    with utils.engine.autocast(x):
+        x = x.permute(0, 2, 1).float()
+        x = F.relu(F.conv1d(x, w[0], w[1], padding=3))
+        x = F.relu(F.conv1d(x, w[2], w[3], padding=2))
+        x = F.relu(F.conv1d(x, w[4], w[5], padding=1))
+    return x.float().reshape(x.shape[0], -1)
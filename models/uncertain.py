@@ -4,7 +4,9 @@ import torch.nn.functional as F
 from torch.distributions import Normal
 from random import shuffle
 import numpy as np
+import models.trunk
 import utils.model
+import utils.timing
 
 
 class SeqConv(nn.Module):
@@ -28,11 +30,7 @@ class SeqConv(nn.Module):
         self.B3_fc = mk(2)
 
     def forward(self, x):
-        x = x.permute(0, 2, 1).to(dtype=torch.float)
-        x = F.relu(F.conv1d(x, self.W1_conv, self.B1_conv, padding=3))
-        x = F.relu(F.conv1d(x, self.W2_conv, self.B2_conv, padding=2))
-        x = F.relu(F.conv1d(x, self.W3_conv, self.B3_conv, padding=1))
-        x = x.reshape(x.shape[0], -1)
+        x = models.trunk.conv([self.W1_conv, self.B1_conv, self.W2_conv, self.B2_conv, self.W3_conv, self.B3_conv], x)
         x = F.relu(x @ self.W1_fc + self.B1_fc)
         x = F.relu(x @ self.W2_fc + self.B2_fc)
         x = x @ self.W3_fc + self.B3_fc
@@ -51,45 +49,44 @@ class UncertainCNN:
             else:
                 nn.init.normal_(param)
 
-    def fit(self, seqs, scores, epochs):
+    @utils.timing.phase('fit')
+    def fit(self, seqs, scores, epochs, **schedule):
         '''Fit encoded sequences to provided scores for provided epochs,
         sampling a model for each minibatch of the provided size.
         '''
-        D = [(self.encode(x), y) for x, y in zip(seqs, scores)] # data tuples
-        M = len(D) // self.minibatch + bool(len(D) % self.minibatch) # number of minibatches
+        D = utils.model.fit_data(self, seqs, scores, **schedule)
 
-        for ep in range(epochs):
-            shuffle(D)
-            for mb in range(M):
+        batches = utils.model.Schedule(len(D), epochs, self.minibatch, **schedule)
+        for idx in batches:
 
-                # get minibatch of X values, and predicted (mu, sigma) for each Y 
-                Di = D[mb * self.minibatch : (mb + 1) * self.minibatch]
-                X = self._process([x for x, y in Di])
-                Y = torch.tensor([y for x, y in Di]).to(self.device)
-                pred = self.model(X)
-                Y_mu, Y_rho = torch.sigmoid(pred[:, 0]), torch.log(1 + torch.exp(pred[:, 1]))
+            # get minibatch of X values, and predicted (mu, sigma) for each Y
+            X, Y = D[idx]
+            pred = self.model(X)
+            Y_mu, Y_rho = torch.sigmoid(pred[:, 0]), torch.log(1 + torch.exp(pred[:, 1]))
 
-                # loss function
-                p_w = sum(Normal(0, 1).log_prob(weight).sum() for weight in self.params) # weights prior
-                p_D = Normal(Y_mu, Y_rho + self._eps).log_prob(Y).sum() # prediction loss
-                loss = - (p_w + p_D)
+            # loss function
+            p_w = sum(Normal(0, 1).log_prob(weight).sum() for weight in self.params) # weights prior
+            p_D = Normal(Y_mu, Y_rho + self._eps).log_prob(Y).sum() # prediction loss
+            loss = - (p_w + p_D)
 
-                # compute and apply gradients
-                self.opt.zero_grad()
-                loss.backward()
-                for weight in self.params:
-                    # we clip gradients to avoid exploding logprobs
-                    nn.utils.clip_grad_norm_(weight, 1)
-                self.opt.step()              
+            # compute and apply gradients
+            self.opt.zero_grad()
+            loss.backward()
+            for weight in self.params:
+                # we clip gradients to avoid exploding logprobs
+                nn.utils.clip_grad_norm_(weight, 1)
+            self.opt.step()
+            batches.update(loss)
             
-    @utils.model.batch
-    def predict(self, seqs):
+    @utils.timing.phase('predict')
+    @utils.model.inference
+    def predict(self, X):
         '''Return (mus, sigmas) for the sequences describing a gaussian for the predicted
         scores of each one.
         '''
-        result = self.model(self._process([self.encode(x) for x in seqs]))
-        return torch.sigmoid(result[:, 0]).detach().cpu().numpy(), \
-                torch.exp(result[:, 1]).add(1).log().detach().cpu().numpy()
+        result = self.model(X)
+        return torch.sigmoid(result[:, 0]).cpu().numpy(), \
+                torch.exp(result[:, 1]).add(1).log().cpu().numpy()
     
     def __call__(self, seqs):
         return self.predict(seqs)
@@ -103,7 +100,6 @@ class UncertainCNN:
             self.device = 'cuda'
         self.alpha = alpha
         self.minibatch = minibatch
-        self._process = lambda x: torch.tensor(np.array(x), requires_grad=True).to(self.device)
         self._make_net(shape)
         self._eps = 1e-6
         self.encode = encoder
@@ -5,45 +5,77 @@ import argparse
 import shutil
 import seaborn as sns
 import matplotlib.pyplot as plt
-import importlib
 import traceback
 import numpy as np
 import multiprocessing
 import torch
 import signal
 import environment.env
+import environment.cache
+import utils.registry
+import utils.threads
+import utils.results
+import utils.timing
+import utils.memory
+import utils.engine
+import utils.model
+import contextlib
 import random
-import time
+import queue
+import gc
 sns.set_style('darkgrid')
 signal.signal(signal.SIGINT, lambda x, y: exit(1))
 np.seterr(divide='ignore', invalid='ignore')
+envs = [] # environments inherited by forked workers, passed to tasks by index
+agent_registry = utils.registry.Registry('agents') # agent factories, imported on first use
+partition = None # split of cores between worker processes
 
 
-def run_agent(env, agent, pos, args, seed, loc):
+def run_agent(env, agent, pos, args, seed, loc, timeout=None):
     '''Run agent in provided environment, with given arguments.
-    env: environment object
+    env: environment object, or index in envs of one inherited from the parent process
     agent: name of agent
     pos: unique identifier for run
     args: arguments to run script
     seed: seed for run
     loc: output directory
+    timeout: seconds after it starts by which the run stops, returning truncated results
     '''
+    if isinstance(env, int):
+        env = envs[env]
+    path = f'results/{loc}/partial/{agent}-{pos}'
+    if os.path.exists(f'{path}.npz') and not utils.results.meta(f'{path}.npz').get('truncated'):
+        return utils.results.load(f'{path}.npz')
+    budget = min(args.budget or np.inf, timeout or np.inf)
     if not torch.cuda.is_available() and pos == 0: print('CUDA not available')
     name = agent + ' ' * (max(map(len, args.agents)) - len(agent))
-    do_run = lambda: env.run(eval(agent, get_agent_modules(), {}), args.cutoff, args.metrics, name, pos)
+    do_run = lambda: env.run(eval(agent, {}, agent_registry), args.cutoff, args.metrics, name, pos,
+                             checkpoint=path, interval=args.checkpoint, budget=None if budget == np.inf else budget)
+    if hasattr(env, 'encode'):
+        getattr(env.encode, 'encoder', env.encode).cache.reset_stats()
+    utils.timing.configure(args.events, args.profile, args.profiler)
+    utils.memory.configure(args.tracemalloc)
+    utils.engine.configure(args.backend, args.precision, args.compile_cache)
+    utils.model.configure(args.inference_memory)
     try:
         random.seed(seed[1])
         np.random.seed(seed[1])
         torch.manual_seed(seed[1])
-        if torch.cuda.is_available():
-            with torch.cuda.device(pos % torch.cuda.device_count()):
+        with partition or contextlib.nullcontext():
+            if torch.cuda.is_available():
+                with torch.cuda.device(pos % torch.cuda.device_count()):
+                    metrics = do_run()
+            else:
                 metrics = do_run()
-        else:
-            metrics = do_run()
     except: 
         traceback.print_exc()
         return None
+    finally:
+        # release the run's memory before a warm worker takes its next task
+        gc.collect()
+        torch.cuda.empty_cache()
     data = dict(
+        run=pos,
         env=args.env,
         agent=agent,
         batch=args.batch,
@@ -51,23 +83,20 @@ def run_agent(env, agent, pos, args, seed, loc):
         cutoff=args.cutoff,
         pretrain=args.pretrain,
         metrics=metrics,
-        seed=seed)
-    np.save(f'results/{loc}/partial/{agent}-{pos}.npy', data)
+        truncated=metrics.truncated,
+        failed=metrics.failed,
+        seed=seed,
+        cache=getattr(env.encode, 'encoder', env.encode).cache.stats())
+    utils.results.save(f'{path}.npz', data)
+    if os.path.exists(f'{path}.ckpt') and not metrics.truncated:
+        os.remove(f'{path}.ckpt')
     return data
 
 
-def get_agent_modules():
-    '''Get dictionary of agent modules.'''
-    files = [f for f in os.listdir('agents') if f.endswith('.py')]
-    agent_modules = {}
-    for f in files :
-        mod = importlib.import_module('agents.' + f[:-3])
-        agent_modules.update(mod.__dict__)
-    return agent_modules
-
-
-def make_plot(title, yaxis, data, loc):
-    '''Make a plot of [(Datum, Label)] data and save to given location in results.'''
+def make_plot(title, yaxis, data, loc, bands=()):
+    '''Make a plot of [(Datum, Label)] data, shading the [(Lower, Upper)] bands
+    around each datum if given, and save to given location in results.
+    '''
     plt.figure()
     plt.title(title)
     plt.xlabel('Batch')
@@ -77,39 +106,26 @@ def make_plot(title, yaxis, data, loc):
             plt.plot(datum)
         else:
             plt.plot(datum, label=label)
+    for lower, upper in bands:
+        plt.fill_between(np.arange(len(lower)), lower, upper, alpha=0.2)
     if any([label is not None for _, label in data]):
         plt.legend()
     plt.savefig(f'results/{loc}.png')
 
 
-def process_data(attr, collected):
-    '''Make plot of metric attr averaged for each agent in the list of collected run results.'''
-    results = {}
-    for agent in [x['agent'] for x in collected]:
-        data = [x['metrics'][attr] for x in collected if x['agent'] == agent]
-        n = max(map(len, data))
-        def pad(x, n):
-            x = list(x)
-            while len(x) < n:
-                x.append(np.nan)
-            return x
-        results[agent] = np.array([pad(x, n) for x in data]).mean(axis=0)
+def process_data(attr, aggregate, args, loc):
+    '''Make plot of metric attr averaged for each agent in the run results aggregate,
+    with 95% confidence intervals.
+    '''
+    agents = [agent for agent in aggregate.agents() if (agent, attr) in aggregate.stats]
     make_plot(f'batch={args.batch}, env={args.env}, reps={args.reps}', attr, 
-                [(datum, agent) for agent, datum in results.items()],
-                f'{loc}/plots/{attr}')
-
-
-def get_result(result, timeout):
-    '''Get result from async_result if it completes before timeout.'''
-    if timeout >= 1:
-        result.wait(timeout=int(timeout))
-    if result.ready() and result.successful():
-        return result.get()
-
+                [(aggregate.mean(agent, attr), agent) for agent in agents],
+                f'{loc}/plots/{attr}',
+                [aggregate.interval(agent, attr) for agent in agents])
 
-if __name__ == '__main__':
 
-    # Parse environment parameters
+def make_parser():
+    '''Return parser of run flags.'''
     parser = argparse.ArgumentParser(description='run flags')
     parser.add_argument('--agents', nargs='+', type=str, help='agent classes to use', required=True)
     parser.add_argument('--metrics', nargs='+', type=str, help='metrics to evaluate at each timestep', required=True)
@@ -120,49 +136,143 @@ if __name__ == '__main__':
     parser.add_argument('--env', type=str, default='GuideEnv', help='environment to run agents')
     parser.add_argument('--reps', type=int, default=1, help='number of trials to average')
     parser.add_argument('--name', type=str, default=None, help='output directory')
-    parser.add_argument('--cpus', type=int, default=multiprocessing.cpu_count(), help='number of agents to run concurrently')
-    parser.add_argument('--timeout', type=int, default=36000, help='max time to run agents in seconds')
+    parser.add_argument('--cpus', type=int, default=multiprocessing.cpu_count(), help='number of cores to split between concurrent agents')
+    parser.add_argument('--threads', type=int, default=None, help='threads per agent (default chosen by agent type)')
+    parser.add_argument('--calibrate', action='store_true', help='choose threads per agent by timing a batch of each agent')
+    parser.add_argument('--affinity', action='store_true', help='pin each agent to its own cores')
+    parser.add_argument('--timeout', type=int, default=36000, help='max seconds each run takes from when it starts (queued runs wait their turn)')
+    parser.add_argument('--budget', type=int, default=None, help='max time for each run in seconds')
     parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--cache', type=int, default=100000, help='max entries in each encoding cache')
+    parser.add_argument('--shared-cache', action='store_true', help='hold encoding caches in shared memory')
+    parser.add_argument('--checkpoint', type=int, default=0, help='batches between run snapshots and logging them (0 to disable)')
+    parser.add_argument('--resume', action='store_true', help='continue runs in the output directory from their last snapshots')
+    parser.add_argument('--warm', action='store_true', help='reuse worker processes across runs')
+    parser.add_argument('--events', action='store_true', help='log the duration of each phase of each iteration')
+    parser.add_argument('--profile', type=int, default=None, help='iteration of each run to profile')
+    parser.add_argument('--profiler', type=str, default='cprofile', choices=['cprofile', 'torch'], help='profiler to use for --profile')
+    parser.add_argument('--tracemalloc', nargs='+', type=int, default=(), help='iterations of each run after which to save allocation snapshots')
+    parser.add_argument('--backend', type=str, default='eager', choices=['eager', 'compile', 'script'], help='run model conv trunks eagerly, with torch.compile or with TorchScript')
+    parser.add_argument('--precision', type=str, default='fp32', choices=['fp32', 'bf16'], help='run model conv trunks in float32 or with bfloat16 autocast')
+    parser.add_argument('--compile-cache', type=str, default='data/cache/compile', help='directory to keep torch.compile kernels in across runs')
+    parser.add_argument('--inference-memory', type=float, default=4, help='MB of memory for each chunk of sequences a model evaluates at once')
+    return parser
 
-    args = parser.parse_args()
 
-    # Set global random seed
+def setup(args):
+    '''Seed the global random generator and make the output directory for args,
+    reusing an interrupted run's seed when resuming. Returns output directory and seed.
+    '''
+    loc = ",".join(args.agents) if args.name is None else args.name
+    assert len(loc) > 0
     if args.seed is not None:
         seed = args.seed
+    elif args.resume and os.path.exists(f'results/{loc}/seed'):
+        seed = int(open(f'results/{loc}/seed').read())
     else:
         seed = random.randint(0, (1 << 32) - 1)
     random.seed(seed)
+    if not args.resume:
+        shutil.rmtree(f'results/{loc}', ignore_errors=True)
+    os.makedirs(f'results/{loc}/partial', exist_ok=True)
+    os.makedirs(f'results/{loc}/plots', exist_ok=True)
+    with open(f'results/{loc}/seed', 'w') as f:
+        f.write(str(seed))
+    return loc, seed
 
-    # Initialize environment
-    env = eval(f'{args.env}', environment.env.__dict__, {})(batch=args.batch, validation=args.validation, pretrain=args.pretrain)
 
-    # Make output directory
-    loc = ",".join(args.agents) if args.name is None else args.name
-    assert len(loc) > 0
-    shutil.rmtree(f'results/{loc}', ignore_errors=True)
-    os.mkdir(f'results/{loc}')
-    os.mkdir(f'results/{loc}/partial')
-    os.mkdir(f'results/{loc}/plots')
+def make_env(args):
+    '''Construct the environment specified by args and register it for workers.
+    Returns its index in envs.
+    '''
+    environment.cache.configure(capacity=args.cache, shared=args.shared_cache)
+    envs.append(eval(f'{args.env}', environment.env.__dict__, {})(batch=args.batch, validation=args.validation, pretrain=args.pretrain))
+    return len(envs) - 1
+
 
-    # Prepare tasks
+def make_tasks(env, args, loc, seed):
+    '''Return shuffled run_agent arguments for each agent and rep in args, each
+    stopping args.timeout seconds after it starts.
+    env: index of environment in envs
+    '''
+    rng = random.Random(seed)
     identifier = lambda i, j: i * args.reps + j
-    make_seed = lambda: (seed, random.randint(0, (1 << 32) - 1))
-    thunks = [(env, agent, identifier(i, j), args, make_seed(), loc)
+    make_seed = lambda: (seed, rng.randint(0, (1 << 32) - 1))
+    tasks = [(env, agent, identifier(i, j), args, make_seed(), loc, args.timeout)
                             for i, agent in enumerate(args.agents)
                             for j in range(args.reps)]
-    random.shuffle(thunks)
+    rng.shuffle(tasks)
+    return tasks
 
-    # Run agents
-    pool = multiprocessing.Pool(processes=args.cpus, maxtasksperchild=1)
-    results = [pool.apply_async(run_agent, thunk) for thunk in thunks]
-    end_time = time.time() + args.timeout
-    collected = [x for x in [get_result(result, end_time - time.time()) for result in results] if x is not None]
-    pool.close()
 
-    # Write output
-    np.save(f'results/{loc}/results.npy', collected)
+def make_pool(agents, cores, warm=False):
+    '''Start worker pool running with the core partition cores.
+    Workers are forked so they share registered environments' pages copy-on-write
+    instead of unpickling them per task, with objects frozen out of gc passes that
+    would dirty them. The modules of the agent specs in agents are imported first,
+    so workers inherit them as well.
+    warm: reuse workers across tasks
+    '''
+    global partition
+    partition = cores
+    for agent in agents:
+        agent_registry.load(agent)
+    gc.freeze()
+    return multiprocessing.get_context('fork').Pool(processes=cores.processes, initializer=cores.initializer,
+                                                    maxtasksperchild=None if warm else 1)
+
 
+def submit(pool, tasks):
+    '''Start run_agent tasks on pool. Returns queue receiving each run's result,
+    or None if it failed, as it completes.
+    '''
+    done = queue.Queue()
+    for task in tasks:
+        pool.apply_async(run_agent, task, callback=done.put, error_callback=lambda e: done.put(None))
+    return done
+
+
+def collect(done, tasks, grace=60):
+    '''Return Aggregate of the results of tasks from the queue done, added in the
+    order runs complete. Runs stop at their timeout after starting, so some run
+    finishes within the longest timeout of any moment while any are left; if none
+    does grace seconds after that, the rest are left out.
+    '''
+    aggregate = utils.results.Aggregate()
+    wait = max(task[-1] for task in tasks) + grace if tasks else 0
+    for _ in tasks:
+        try:
+            data = done.get(timeout=wait)
+        except queue.Empty:
+            break
+        if data is not None:
+            aggregate.add(data)
+    return aggregate
+
+
+def write_output(aggregate, args, loc):
+    '''Write summary and plots of the run results aggregate.'''
+    aggregate.save(f'results/{loc}/summary.npz')
     for metric in args.metrics:
-        process_data(metric, collected)
+        process_data(metric, aggregate, args, loc)
 
 
+if __name__ == '__main__':
+    args = make_parser().parse_args()
+    loc, seed = setup(args)
+    env = make_env(args)
+    tasks = make_tasks(env, args, loc, seed)
+
+    # Split cores between concurrent runs, so torch and BLAS pools don't oversubscribe them
+    if args.threads is not None:
+        threads = args.threads
+    elif args.calibrate:
+        threads = max(utils.threads.calibrate(lambda: envs[env].run(eval(agent, {}, agent_registry), 1, []), args.cpus)
+                        for agent in args.agents)
+    else:
+        threads = utils.threads.heuristic(args.agents)
+
+    pool = make_pool(args.agents, utils.threads.Partition(args.cpus, threads, len(tasks), args.affinity), args.warm)
+    aggregate = collect(submit(pool, tasks), tasks)
+    pool.close()
+    write_output(aggregate, args, loc)
@@ -0,0 +1,34 @@
+import pickle
+import numpy as np
+import torch
+import environment.env
+import utils.checkpoint
+from agents.thompson import ThompsonAgent
+
+
+def make_agent(env):
+    return ThompsonAgent(epochs=1)(env.split_data()[1], env.shape, env.batch, env.encode)
+
+
+def test_nested_models_skip_encoder():
+    env = environment.env.GenericEnv('data/toy/20mer.csv')(batch=10, validation=0.2, pretrain=20)
+    agent = make_agent(env)
+    state = utils.checkpoint.state_dict(agent)
+    assert isinstance(state['model'], utils.checkpoint._Attributes)
+    assert 'encode' not in state['model']
+    assert len(pickle.dumps(state)) < len(pickle.dumps(agent.model))
+
+
+def test_load_keeps_encoder_and_optimized_tensors():
+    env = environment.env.GenericEnv('data/toy/20mer.csv')(batch=10, validation=0.2, pretrain=20)
+    saved = make_agent(env)
+    with torch.no_grad():
+        for w in saved.model.mu:
+            w.add_(1.)
+    state = pickle.loads(pickle.dumps(utils.checkpoint.state_dict(saved)))
+    agent = make_agent(env)
+    mu = agent.model.mu
+    utils.checkpoint.load_state_dict(agent, state)
+    assert agent.model.encode is env.encode
+    assert agent.model.mu is mu and all(w is p for w, p in zip(mu, agent.model.opt.param_groups[0]['params']))
+    assert all(torch.equal(a, b) for a, b in zip(agent.model.mu, saved.model.mu))
@@ -0,0 +1,47 @@
+import os
+import pytest
+import environment.dataset
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(environment.dataset, 'CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path
+
+
+def counting(seqs, labels):
+    '''Return parse function returning seqs and labels, counting its calls.'''
+    def parse():
+        parse.calls += 1
+        return seqs, labels
+    parse.calls = 0
+    return parse
+
+
+def test_load_rebuilds_when_source_changes(cache):
+    source = cache / 'data.csv'
+    source.write_text('+AT,1\n')
+    parse = counting(['+AT', '+CG'], [1., 2.])
+    first = environment.dataset.load('data', [str(source)], parse)
+    assert environment.dataset.load('data', [str(source)], parse).path == first.path and parse.calls == 1
+    source.write_text('+AT,1\n+CG,2\n')
+    second = environment.dataset.load('data', [str(source)], parse)
+    assert second.path != first.path and parse.calls == 2
+    os.utime(source, ns=(0, 0))
+    assert environment.dataset.load('data', [str(source)], parse).path != second.path and parse.calls == 3
+    assert second.items() == [('+AT', 1.), ('+CG', 2.)]
+
+
+def test_generate_keys_cache_on_params(cache):
+    make = counting(['+AT'], [0.5])
+    first = environment.dataset.generate('motif', dict(N=2, seed=1), make, cache=True)
+    assert environment.dataset.generate('motif', dict(seed=1, N=2), make, cache=True).path == first.path
+    assert make.calls == 1
+    assert environment.dataset.generate('motif', dict(N=2, seed=2), make, cache=True).path != first.path
+    assert make.calls == 2
+
+
+def test_generate_without_cache_writes_nothing(cache):
+    dataset = environment.dataset.generate('motif', dict(seed=1), counting(['+AT'], [0.5]))
+    assert dataset.path is None and dataset.items() == [('+AT', 0.5)]
+    assert not os.path.exists(environment.dataset.CACHE_DIR)
@@ -0,0 +1,35 @@
+import pytest
+import torch
+import utils.engine
+import models.trunk
+
+
+@pytest.fixture
+def backend():
+    def configure(name):
+        utils.engine.configure(name)
+    yield configure
+    utils.engine.configure()
+
+
+def test_script_backend_returns_script_module(backend):
+    backend('script')
+    module = torch.nn.Sequential(torch.nn.Conv1d(4, 8, 3, padding=1), torch.nn.ReLU())
+    assert isinstance(utils.engine.compile(module), torch.jit.ScriptModule)
+
+
+def test_script_trunk_matches_eager(backend):
+    torch.manual_seed(0)
+    eager = models.trunk.ConvTrunk(20, 4)
+    backend('script')
+    scripted = models.trunk.ConvTrunk(20, 4)
+    scripted.load_state_dict(eager.state_dict())
+    assert isinstance(scripted._run, torch.jit.ScriptModule)
+    x = torch.rand(10, 20, 4)
+    assert torch.allclose(eager(x), scripted(x))
+
+
+def test_eager_backend_returns_module(backend):
+    backend('eager')
+    module = torch.nn.ReLU()
+    assert utils.engine.compile(module) is module
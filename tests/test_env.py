@@ -0,0 +1,62 @@
+import json
+import environment.env
+from agents.random import RandomAgent
+
+
+def make_env():
+    return environment.env.GenericEnv('data/toy/20mer.csv')(batch=10, validation=0.2, pretrain=20)
+
+
+def FailingAgent(after):
+    '''RandomAgent raising RuntimeError on its observe after the first ones.'''
+
+    class Agent(RandomAgent(epochs=1)):
+
+        def observe(self, data):
+            super().observe(data)
+            if len(self.seen) > len(self.prior) + after * self.batch:
+                raise RuntimeError('failed')
+
+    return Agent
+
+
+def test_failed_run_is_not_truncated(tmp_path):
+    path = str(tmp_path / 'run')
+    results = make_env().run(FailingAgent(2), 10, ['Regret(0.2)'], checkpoint=path, interval=1)
+    assert results.failed and not results.truncated
+    assert len(results['Regret(0.2)']) == 2
+    assert [json.loads(line)['iteration'] for line in open(f'{path}.jsonl')] == [1, 2]
+
+
+def test_budget_run_is_truncated(tmp_path):
+    results = make_env().run(RandomAgent(epochs=1), 10, ['Regret(0.2)'], checkpoint=str(tmp_path / 'run'), interval=1, budget=0)
+    assert results.truncated and not results.failed
+    assert (tmp_path / 'run.ckpt').exists()
+
+
+def PoolAgent():
+    '''RandomAgent checking that each pool it acts on holds exactly the IDs of
+    the unseen sequences.
+    '''
+
+    class Agent(RandomAgent(epochs=1)):
+
+        ids = True
+
+        def act(self, seqs):
+            unseen = [x for x in self.universe if x not in self.seen]
+            assert len(seqs) == len(set(seqs.tolist())) == len(unseen)
+            assert set(seqs.tolist()) == set(self.encode.rows(unseen).tolist())
+            return super().act(seqs)
+
+    return Agent
+
+
+def test_pool_holds_unseen_ids(tmp_path):
+    env = make_env()
+    Agent = PoolAgent()
+    Agent.universe = list(env.env)
+    path = str(tmp_path / 'run')
+    assert len(env.run(Agent, 3, ['Regret(0.2)'], checkpoint=path, interval=1)['Regret(0.2)']) == 3
+    resumed = env.run(Agent, 8, ['Regret(0.2)'], checkpoint=path, interval=1) # continues from the pool snapshot
+    assert len(resumed['Regret(0.2)']) == 8
@@ -0,0 +1,30 @@
+import random
+import numpy as np
+import Bio.SeqUtils
+import Bio.SeqUtils.MeltingTemp as Tm
+import environment.featurize
+
+
+def baseline_encode_dna(seq):
+    '''encode_dna as originally computed one sequence at a time, with Tm_staluc
+    spelled as the Tm_NN call it made.
+    '''
+    s = seq[1:]
+    arr = np.zeros([len(s), 72])
+    arr[:, 4] = 1 if seq[0] == '-' else 0
+    arr[:, 5] = sum(i in 'GC' for i in seq) / len(seq)
+    arr[:, 6] = [Tm.Tm_NN(x, dnac1=25, dnac2=25, Na=50) / 1e3 for x in s]
+    arr[:, 7] = [Bio.SeqUtils.molecular_weight(x) / 1e3 for x in s]
+    for j in range(len(s) - 2):
+        arr[j, 8 + int(''.join(str('ATCG'.index(b)) for b in s[j : j + 3]), 4)] = 1
+    arr[np.arange(len(s)), ['ATCG'.index(i) for i in s]] = 1
+    return arr
+
+
+def test_rich_encoder_matches_baseline():
+    rng = random.Random(0)
+    seqs = [rng.choice('+-') + ''.join(rng.choice('ATCG') for _ in range(20)) for _ in range(50)]
+    encoded = environment.featurize.RichSeqEncoder(20).batch(seqs, np.float64)
+    baseline = np.stack([baseline_encode_dna(seq) for seq in seqs])
+    assert np.allclose(encoded[:, :, 6], baseline[:, :, 6])
+    assert np.allclose(encoded, baseline)
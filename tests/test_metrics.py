@@ -0,0 +1,57 @@
+import random
+import numpy as np
+import pytest
+import environment.metrics
+
+
+def baseline(name, top):
+    '''Metric as originally computed from whole arrays each timestep.'''
+
+    def regret():
+        history = 0
+        def f(seen, unseen, selected):
+            nonlocal history
+            to_check = int(top * len(selected))
+            r = sum(sorted(unseen[x] for x in selected)[-to_check:])
+            r_star = sum(sorted(unseen.values())[-to_check:])
+            history += r_star - r
+            return history
+        return f
+
+    def score():
+        def f(seen, unseen, selected):
+            to_check = int(top * (len(seen) + len(selected)))
+            to_score = list(seen.values()) + [unseen[x] for x in selected]
+            return np.array(sorted(to_score)[-to_check:]).mean()
+        return f
+
+    def discovery():
+        best = None
+        def f(seen, unseen, selected):
+            nonlocal best
+            if best is None:
+                all_seqs = {**seen, **unseen}
+                num_top = int(top * len(all_seqs))
+                best = set(sorted(all_seqs.keys(), key=lambda x: all_seqs[x])[-num_top:])
+            to_check = list(seen.keys()) + list(selected)
+            return sum(x in best for x in to_check) / len(best)
+        return f
+
+    return dict(Regret=regret, Score=score, Discovery=discovery)[name]()
+
+
+@pytest.mark.parametrize('name', ['Regret', 'Score', 'Discovery'])
+@pytest.mark.parametrize('top, batch', [(0.2, 10), (0.2, 3), (1, 7), (0.01, 5), (0.001, 4)])
+def test_incremental_metrics_match_baseline(name, top, batch):
+    rng = random.Random(batch)
+    labels = {f'+{i:04d}': round(rng.random(), 1) for i in range(300)} # rounded so labels tie
+    keys = list(labels)
+    rng.shuffle(keys)
+    seen = {x: labels[x] for x in keys[:20]}
+    unseen = {x: labels[x] for x in keys[20:]}
+    f, g = getattr(environment.metrics, name)(top)(seen), baseline(name, top)
+    while len(unseen) >= batch:
+        selected = rng.sample(list(unseen), batch)
+        assert np.isclose(f(seen, unseen, selected), g(seen, unseen, selected))
+        for x in selected:
+            seen[x] = unseen.pop(x)
@@ -0,0 +1,47 @@
+import numpy as np
+import torch
+import utils.model
+
+
+class Model:
+    device = 'cpu'
+
+    def __init__(self):
+        self.encoded = []
+        self.encode = self
+
+    def batch(self, seqs):
+        self.encoded += seqs
+        return np.array([[float(s)] for s in seqs])
+
+
+def test_dataset_extend_keeps_rows():
+    D = utils.model.Dataset(np.zeros((3, 2)), np.zeros(3), 'cpu')
+    for i in range(1, 6):
+        D.extend(np.full((i, 2), i), np.full(i, i))
+    assert len(D) == 18 and D.X.shape == (18, 2)
+    assert torch.equal(D.Y, torch.tensor([0.] * 3 + [i for i in range(1, 6) for _ in range(i)]))
+    X, Y = D[torch.tensor([3, 17])]
+    assert torch.equal(Y, torch.tensor([1., 5.])) and torch.equal(X[:, 0], Y)
+
+
+def test_incremental_fit_data_encodes_new_sequences():
+    model = Model()
+    seqs, scores = list(range(10)), [0.] * 10
+    utils.model.fit_data(model, seqs, scores)
+    model.encoded = []
+    D = utils.model.fit_data(model, seqs + [10, 11], scores + [1., 1.], recent=2)
+    assert model.encoded == [10, 11] and D is model.data
+    assert torch.equal(D.X[:, 0], torch.arange(12.))
+    utils.model.fit_data(model, seqs + [10, 11], scores + [1., 1.])
+    assert len(model.encoded) == 14
+
+
+def test_incremental_schedule_replays_earlier_examples():
+    batches = utils.model.Schedule(1000, 1, 10, recent=4, steps=3, replay=0.5)
+    steps = list(batches)
+    assert len(steps) == 3
+    for idx in steps:
+        assert len(idx) == 10 and sorted(idx[:4].tolist()) == [996, 997, 998, 999]
+        assert (idx[4:] < 996).all()
+    assert len(list(utils.model.Schedule(4, 1, 10, recent=4, steps=1))[0]) == 4
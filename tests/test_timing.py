@@ -0,0 +1,21 @@
+import threading
+import time
+import utils.timing
+
+
+def test_untimed_thread_does_not_count():
+    utils.timing.start()
+
+    def background():
+        with utils.timing.untimed(), utils.timing.phase('encode'):
+            time.sleep(0.05)
+
+    with utils.timing.phase('predict'):
+        thread = threading.Thread(target=background)
+        thread.start()
+        with utils.timing.phase('encode'):
+            time.sleep(0.01)
+        thread.join()
+    times = utils.timing.lap()
+    assert 0.01 <= times['encode'] < 0.05 and times['predict'] >= 0.05
+    assert not utils.timing._depth['encode']
@@ -0,0 +1,130 @@
+import numpy as np
+import random
+import pickle
+import torch
+import os
+import types
+import functools
+
+
+class _Attributes(dict):
+    '''Saved attributes of an object that could not be pickled whole.'''
+
+
+class _Weights:
+    '''Saved state dict of a torch module or optimizer.'''
+
+    def __init__(self, state):
+        self.state = state
+
+
+def _picklable(value):
+    try:
+        pickle.dumps(value)
+        return True
+    except Exception:
+        return False
+
+
+def _skipped(value):
+    '''Functions and parameters restored through their modules are not saved.'''
+    if isinstance(value, (types.FunctionType, types.MethodType, types.BuiltinFunctionType, functools.partial, type)):
+        return True
+    if isinstance(value, (list, tuple)) and len(value):
+        return all(isinstance(x, torch.nn.Parameter) for x in value)
+    return isinstance(value, torch.nn.Parameter)
+
+
+def _holds(value, skip, visited=None):
+    '''Whether object value has an attribute named in skip, itself or through
+    the objects it holds.
+    '''
+    if not hasattr(value, '__dict__') or isinstance(value, (torch.nn.Module, torch.optim.Optimizer, type)):
+        return False
+    visited = set() if visited is None else visited
+    if id(value) in visited:
+        return False
+    visited.add(id(value))
+    return any(name in skip or _holds(x, skip, visited) for name, x in vars(value).items())
+
+
+def state_dict(obj, skip=('encode',)):
+    '''Return picklable snapshot of the attributes of obj (e.g. an agent),
+    recursing into objects that cannot be pickled whole or that hold an
+    attribute named in skip. Torch modules and optimizers are saved by their
+    state dicts. Attributes named in skip (at any depth), functions, module
+    parameters and other unpicklable values are omitted.
+    '''
+    state = _Attributes()
+    for name, value in vars(obj).items():
+        if name in skip:
+            continue
+        if isinstance(value, (torch.nn.Module, torch.optim.Optimizer)):
+            state[name] = _Weights(value.state_dict())
+        elif _skipped(value):
+            continue
+        elif _holds(value, skip) or not _picklable(value) and hasattr(value, '__dict__'):
+            state[name] = state_dict(value, skip)
+        elif _picklable(value):
+            state[name] = value
+    return state
+
+
+def _tensors(value):
+    '''Return value as a list of tensors if it is a tensor or list of them, else None.'''
+    if isinstance(value, torch.Tensor):
+        return [value]
+    if isinstance(value, list) and len(value) and all(isinstance(x, torch.Tensor) for x in value):
+        return value
+
+
+def load_state_dict(obj, state):
+    '''Restore attributes of obj saved with state_dict. Modules, optimizers,
+    tensors and nested objects are loaded in place, so obj should be constructed
+    the same way as the object that was saved; skipped attributes such as the
+    environment's encoder keep the values obj was constructed with.
+    '''
+    for name, value in state.items():
+        current = getattr(obj, name, None)
+        if isinstance(value, _Weights):
+            if hasattr(current, 'load_state_dict'):
+                current.load_state_dict(value.state)
+        elif isinstance(value, _Attributes):
+            if current is not None:
+                load_state_dict(current, value)
+        elif _tensors(current) and _tensors(value) and len(_tensors(current)) == len(_tensors(value)) \
+                and all(old.shape == new.shape for old, new in zip(_tensors(current), _tensors(value))):
+            with torch.no_grad(): # in place, so optimizers keep the same tensors
+                for old, new in zip(_tensors(current), _tensors(value)):
+                    old.copy_(new)
+        else:
+            setattr(obj, name, value)
+
+
+def rng_state():
+    '''Return states of the python, numpy and torch random number generators.'''
+    return dict(random=random.getstate(), numpy=np.random.get_state(), torch=torch.get_rng_state(),
+                cuda=torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None)
+
+
+def set_rng_state(state):
+    '''Restore random number generator states from rng_state.'''
+    random.setstate(state['random'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if state['cuda'] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def save(path, snapshot):
+    '''Write snapshot atomically, so an interrupted write keeps the previous one.'''
+    tmp = f'{path}.{os.getpid()}.tmp'
+    torch.save(snapshot, tmp)
+    os.replace(tmp, path)
+
+
+def load(path):
+    '''Return snapshot written by save, or None if there is none.'''
+    if not os.path.exists(path):
+        return None
+    return torch.load(path, map_location='cpu', weights_only=False)
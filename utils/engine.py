@@ -0,0 +1,47 @@
+import warnings
+import os
+import torch
+from torch import nn
+
+config = dict(backend='eager', precision='fp32', cache=None)
+
+
+def configure(backend='eager', precision='fp32', cache=None):
+    '''Set how models built afterwards run their conv trunks.
+    backend: eager, compile (torch.compile) or script (TorchScript)
+    precision: fp32, or bf16 for bfloat16 autocast
+    cache: directory to keep torch.compile kernels in across runs
+    '''
+    config.update(backend=backend, precision=precision, cache=cache)
+    if cache and backend == 'compile':
+        os.makedirs(cache, exist_ok=True)
+        os.environ['TORCHINDUCTOR_CACHE_DIR'] = os.path.abspath(cache)
+        import torch._inductor.config as inductor
+        inductor.fx_graph_cache = True
+
+
+def compile(module):
+    '''Return function running module with the configured backend, sharing its
+    parameters. Errors compiling module are raised rather than falling back
+    to running it eagerly.
+    '''
+    if config['backend'] == 'compile':
+        return torch.compile(module, dynamic=True)
+    if config['backend'] == 'script':
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            return torch.jit.script(module)
+    return module
+
+
+def autocast(x):
+    '''Context running ops on tensor x's device in the configured precision.'''
+    return torch.autocast(x.device.type, dtype=torch.bfloat16, enabled=config['precision'] == 'bf16')
+
+
+def step(opt, loss, params, clip=1.):
+    '''Take optimizer step on loss, clipping the gradient norm of params to clip.'''
+    opt.zero_grad()
+    loss.backward()
+    nn.utils.clip_grad_norm_(params, clip)
+    opt.step()
@@ -1,6 +1,7 @@
 import numpy as np
 from random import sample, choice, random
 from scipy.spatial.distance import cdist, pdist, squareform
+import utils.timing
 
 
 def cost(pts):
@@ -9,6 +10,7 @@ def cost(pts):
     return np.exp(-dist).sum()
 
 
+@utils.timing.phase('diversity')
 def mcmc(k, em, iters, T=0, lam=1.):
     '''Given points in em, selects k maximally separated points
     approximated by MCMC iteration and returns their indices.
@@ -0,0 +1,60 @@
+import tracemalloc
+import resource
+import sys
+import os
+
+config = dict(snapshots=(), top=25, frames=1)
+
+
+def configure(snapshots=(), top=25, frames=1):
+    '''Set options for runs started afterwards.
+    snapshots: iterations after which to save tracemalloc snapshots
+    top: allocation sites listed in each snapshot summary
+    frames: stack frames kept per allocation
+    '''
+    config.update(snapshots=tuple(snapshots), top=top, frames=frames)
+
+
+def rss():
+    '''Return current resident set size of this process in MB.'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss()
+
+
+def peak_rss():
+    '''Return peak resident set size of this process in MB.'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10 # bytes on macOS, KB elsewhere
+
+
+def start():
+    '''Start tracing allocations if the run takes snapshots.'''
+    if config['snapshots'] and not tracemalloc.is_tracing():
+        tracemalloc.start(config['frames'])
+
+
+def stop():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def snapshot(iteration, path):
+    '''If iteration is one to snapshot, save the tracemalloc snapshot to
+    {path}.tracemalloc and its top allocation sites to {path}.tracemalloc.txt.
+    '''
+    if iteration not in config['snapshots'] or not tracemalloc.is_tracing():
+        return
+    snap = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'), tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')])
+    snap.dump(f'{path}.tracemalloc')
+    stats = snap.statistics('traceback' if config['frames'] > 1 else 'lineno')
+    current, peak = tracemalloc.get_traced_memory()
+    with open(f'{path}.tracemalloc.txt', 'w') as f:
+        f.write(f'iteration {iteration}: traced {current / 2 ** 20:.1f}MB (peak {peak / 2 ** 20:.1f}MB), '
+                f'rss {rss():.1f}MB (peak {peak_rss():.1f}MB)\n')
+        for stat in stats[:config['top']]:
+            f.write(f'{stat.size / 2 ** 20:.2f}MB in {stat.count} blocks\n')
+            f.writelines(f'    {line}\n' for line in stat.traceback.format())
@@ -1,14 +1,197 @@
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import torch
+import utils.timing
+
+config = dict(memory=4 * 2 ** 20, expansion=64)
+
+
+def configure(memory=4, expansion=64):
+    '''Set options for inference afterwards.
+    memory: MB of memory a chunk of sequences evaluated together may take
+    expansion: rough ratio of a model's activation memory to its encoded input
+    '''
+    config.update(memory=memory * 2 ** 20, expansion=expansion)
+
+
+def _store(out, result, i, n):
+    '''Write result, an array or tuple of arrays for a chunk starting at row i,
+    into out, allocating out for n rows on the first chunk.
+    '''
+    parts = result if isinstance(result, tuple) else (result,)
+    if out is None:
+        out = [np.empty((n, *np.shape(part)[1:]), dtype=np.asarray(part).dtype) for part in parts]
+    for o, part in zip(out, parts):
+        o[i : i + len(part)] = part
+    return out
+
 
 def batch(f):
     '''Decorator on method to evaluate over first argument in minibatches
-    of size self.minibatch.
-    '''
-    def method(self, seqs, *args):
-        results = []
-        while len(seqs):
-            results += list(f(self, seqs[:self.minibatch], *args))
-            seqs = seqs[self.minibatch:]
-        return np.array(results)
+    of size self.minibatch, returning an array, or a tuple of arrays if the
+    method returns tuples.
+    '''
+    def method(self, seqs, *args, **kwargs):
+        out = None
+        for i in range(0, len(seqs), self.minibatch):
+            result = f(self, seqs[i : i + self.minibatch], *args, **kwargs)
+            out = _store(out, result, i, len(seqs))
+        if out is None:
+            return np.array([])
+        return tuple(out) if isinstance(result, tuple) else out[0]
     return method
 
+
+def inference(f):
+    '''Decorator on model method taking a float tensor of encoded sequences on
+    self.device, to evaluate it over a list of sequences instead. Sequences are
+    encoded with self.encode in chunks sized to fit config['memory'] (at least
+    self.minibatch), the next chunk on a background thread while the model runs
+    on the current one in torch.inference_mode. That encoding is not timed as a
+    utils.timing phase, as it overlaps the method's own. Returns an array, or a
+    tuple of arrays if the method returns tuples.
+    '''
+    def method(self, seqs, *args, **kwargs):
+        n = len(seqs)
+        if n == 0:
+            return np.array([])
+
+        def encode(i, j):
+            with utils.timing.untimed(): # overlaps the method's phase on the main thread
+                return np.asarray(self.encode.batch(seqs[i:j]))
+
+        out, i, size = None, 0, min(self.minibatch, n)
+        with ThreadPoolExecutor(1) as prefetch:
+            pending = prefetch.submit(encode, 0, size)
+            while i < n:
+                X = pending.result()
+                if out is None:
+                    size = max(self.minibatch, int(config['memory'] / (config['expansion'] * X.nbytes / len(X))))
+                j = i + len(X)
+                if j < n:
+                    pending = prefetch.submit(encode, j, min(j + size, n))
+                with torch.inference_mode():
+                    result = f(self, torch.from_numpy(X).to(self.device).float(), *args, **kwargs)
+                out = _store(out, result, i, n)
+                i = j
+        return tuple(out) if isinstance(result, tuple) else out[0]
+    return method
+
+
+class Dataset:
+    '''Encoded examples and labels stacked into float tensors on device, so
+    minibatches are gathered by indexing with a tensor of example indices. The
+    tensors grow geometrically as examples are appended with extend.
+    '''
+
+    def __init__(self, X, Y, device):
+        '''X: encoded examples
+        Y: labels
+        device: torch device to hold the tensors
+        '''
+        self.device = device
+        self._X = torch.from_numpy(np.asarray(X, dtype=np.float32)).to(device)
+        self._Y = torch.from_numpy(np.asarray(Y, dtype=np.float32)).to(device)
+        self.n = len(self._Y)
+
+    X = property(lambda self: self._X[:self.n])
+    Y = property(lambda self: self._Y[:self.n])
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, idx):
+        idx = idx.to(self.device)
+        return self._X[idx], self._Y[idx]
+
+    def extend(self, X, Y):
+        '''Append encoded examples X with labels Y.'''
+        X = torch.from_numpy(np.asarray(X, dtype=np.float32)).to(self.device)
+        Y = torch.from_numpy(np.asarray(Y, dtype=np.float32)).to(self.device)
+        n = self.n + len(Y)
+        if n > len(self._Y):
+            size = max(n, 2 * len(self._Y))
+            self._X = torch.cat([self.X, self._X.new_empty((size - self.n, *self._X.shape[1:]))])
+            self._Y = torch.cat([self.Y, self._Y.new_empty((size - self.n, *self._Y.shape[1:]))])
+        self._X[self.n : n] = X
+        self._Y[self.n : n] = Y
+        self.n = n
+
+
+def fit_data(model, seqs, scores, recent=None, **schedule):
+    '''Return Dataset of seqs and scores for a fit of model. Training incrementally
+    on the recent last ones, the Dataset of model's last fit is extended with just
+    those when it holds the rest, so only new sequences are encoded.
+    '''
+    data = getattr(model, 'data', None)
+    if recent is not None and data is not None and len(data) == len(seqs) - recent:
+        data.extend(model.encode.batch(seqs[len(data):]), scores[len(data):])
+    else:
+        model.data = data = Dataset(model.encode.batch(seqs), scores, model.device)
+    return data
+
+
+class Schedule:
+    '''Minibatches of example index tensors for one call to a model's fit. By
+    default each of epochs passes over all the examples in shuffled minibatches. Given
+    recent and steps, training is incremental instead: each of steps minibatches
+    mixes the recent examples (the last ones) with a replay sample drawn with
+    replacement from the earlier ones, so the cost of a fit does not grow with the
+    number of examples.
+    '''
+
+    def __init__(self, n, epochs, minibatch, recent=None, steps=None, replay=0.5, tol=None):
+        '''n: number of examples
+        epochs: passes over all examples when not incremental
+        minibatch: minibatch size
+        recent: number of new examples, or None to retrain on all of them
+        steps: minibatches per incremental fit
+        replay: portion of each incremental minibatch drawn from earlier examples
+        tol: stop once the smoothed loss changes by less than this fraction in a step
+        '''
+        self.n = n
+        self.epochs = epochs
+        self.minibatch = minibatch
+        self.recent = recent
+        self.steps = steps
+        self.replay = replay
+        self.tol = tol
+        self.loss = None # exponential moving average of minibatch losses
+        self.done = False
+
+    def __iter__(self):
+        if self.recent is None or self.steps is None:
+            for ep in range(self.epochs):
+                idx = torch.randperm(self.n)
+                for mb in range(0, self.n, self.minibatch):
+                    yield idx[mb : mb + self.minibatch]
+                    if self.done:
+                        return
+        else:
+            split = self.n - min(self.recent, self.n) # first new example
+            for step in range(self.steps):
+                k = min(self.n - split, self.minibatch - int(round(self.replay * self.minibatch)))
+                replay = torch.randint(split, (self.minibatch - k,)) if split else torch.empty(0, dtype=torch.long)
+                yield torch.cat([split + torch.randperm(self.n - split)[:k], replay])
+                if self.done:
+                    return
+
+    def update(self, loss):
+        '''Record the loss of the last minibatch, ending the schedule early once
+        it has converged if tol is set.
+        '''
+        if self.tol is None:
+            return
+        loss = float(loss)
+        last, self.loss = self.loss, loss if self.loss is None else 0.9 * self.loss + 0.1 * loss
+        self.done = last is not None and abs(self.loss - last) <= self.tol * abs(last)
+
+
+def incremental(new, steps=None, replay=0.5, tol=None):
+    '''Return fit options training incrementally on the latest observations new
+    (the last ones passed to fit) with the Schedule options, or no options to
+    retrain on all observations if steps is None.
+    '''
+    if steps is None:
+        return {}
+    return dict(recent=len(new), steps=steps, replay=replay, tol=tol)
@@ -0,0 +1,34 @@
+import importlib
+import ast
+import os
+import re
+
+
+class Registry(dict):
+    '''Lazy mapping from the names defined at the top level of the modules in a
+    package directory to their values. Modules are found by scanning their
+    source, and only imported when one of their names is looked up, so the
+    registry can be used as the locals for eval of specs like "GreedyAgent(epochs=10)".
+    '''
+
+    def __init__(self, package):
+        super().__init__()
+        self.package = package
+        self.modules = {} # name to module defining it
+        for f in sorted(os.listdir(package)):
+            if f.endswith('.py') and f != '__init__.py':
+                for name in re.findall(r'^(?:def|class) (\w+)', open(f'{package}/{f}').read(), re.M):
+                    self.modules.setdefault(name, f[:-3])
+
+    def __missing__(self, name):
+        if name not in self.modules:
+            raise KeyError(name)
+        module = importlib.import_module(f'{self.package}.{self.modules[name]}')
+        self[name] = getattr(module, name)
+        return self[name]
+
+    def load(self, spec):
+        '''Import the modules defining the names used in the expression spec.'''
+        for node in ast.walk(ast.parse(spec, mode='eval')):
+            if isinstance(node, ast.Name) and node.id in self.modules:
+                self[node.id]
@@ -0,0 +1,136 @@
+import numpy as np
+import json
+import glob
+import os
+
+
+def save(path, data):
+    '''Write run result dictionary data as a columnar shard with one row per
+    (run, iteration, metric), keeping its other fields as JSON metadata.
+    data: dictionary with run id, agent name and metrics mapping metric names
+        to their values at each iteration
+    '''
+    names = list(data['metrics'])
+    values = [np.asarray(data['metrics'][name], dtype=np.float64).reshape(-1) for name in names]
+    lengths = [len(x) for x in values]
+    meta = {key: value for key, value in data.items() if key != 'metrics'}
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f,
+            run=np.full([sum(lengths)], data['run'], dtype=np.int32),
+            iteration=np.concatenate([np.arange(n, dtype=np.int32) for n in [0, *lengths]]),
+            metric=np.repeat(np.arange(len(names), dtype=np.int16), lengths),
+            value=np.concatenate([np.zeros([0]), *values]),
+            meta=np.array(json.dumps(dict(meta, metrics=names), default=str)))
+    os.replace(tmp, path)
+
+
+def meta(path):
+    '''Return metadata of the shard at path without reading its rows.'''
+    with np.load(path) as f:
+        return json.loads(str(f['meta']))
+
+
+def load(path):
+    '''Return run result dictionary saved in the shard at path.'''
+    with np.load(path) as f:
+        data = json.loads(str(f['meta']))
+        metric, value = f['metric'], f['value']
+    data['metrics'] = {name: value[metric == i] for i, name in enumerate(data['metrics'])}
+    return data
+
+
+def shards(*dirs):
+    '''Return paths of all run shards in the experiment directories dirs.'''
+    return [path for d in dirs for path in sorted(glob.glob(f'{d}/partial/*.npz'))]
+
+
+class Aggregate:
+    '''Running mean and variance of each metric at each iteration across the
+    runs of each agent, updated with Welford's algorithm as runs are added.
+    Iterations a run did not reach, or with NaN values, are left out.
+    '''
+
+    def __init__(self):
+        self.stats = {} # (agent, metric) to [count, mean, sum of squared deviations] arrays
+
+    def add(self, data):
+        '''Add run result dictionary data.'''
+        for metric, values in data['metrics'].items():
+            values = np.asarray(values, dtype=np.float64).reshape(-1)
+            count, mean, m2 = self._grow((data['agent'], metric), len(values))
+            n = len(values)
+            valid = ~np.isnan(values)
+            count[:n] += valid
+            delta = np.where(valid, values - mean[:n], 0.)
+            mean[:n] += np.where(valid, delta / np.maximum(count[:n], 1), 0.)
+            m2[:n] += np.where(valid, delta * (values - mean[:n]), 0.)
+
+    def _grow(self, key, n):
+        if key not in self.stats:
+            self.stats[key] = [np.zeros([0], dtype=np.int64), np.zeros([0]), np.zeros([0])]
+        stats = self.stats[key]
+        if len(stats[0]) < n:
+            stats[:] = [np.concatenate([x, np.zeros([n - len(x)], dtype=x.dtype)]) for x in stats]
+        return stats
+
+    def update(self, paths, agents=None, metrics=None):
+        '''Add the runs in shards paths, skipping runs of agents not in agents and
+        metrics not in metrics if they are given. Returns self.
+        '''
+        for path in paths:
+            if agents is not None and meta(path)['agent'] not in agents:
+                continue
+            data = load(path)
+            if metrics is not None:
+                data['metrics'] = {k: v for k, v in data['metrics'].items() if k in metrics}
+            self.add(data)
+        return self
+
+    def agents(self):
+        return list(dict.fromkeys(agent for agent, metric in self.stats))
+
+    def metrics(self):
+        return list(dict.fromkeys(metric for agent, metric in self.stats))
+
+    def count(self, agent, metric):
+        '''Return number of runs of agent reaching each iteration.'''
+        return self.stats[agent, metric][0]
+
+    def mean(self, agent, metric):
+        '''Return mean of metric across runs of agent at each iteration.'''
+        count, mean, m2 = self.stats[agent, metric]
+        return np.where(count > 0, mean, np.nan)
+
+    def std(self, agent, metric):
+        '''Return sample standard deviation of metric across runs of agent at each iteration.'''
+        count, mean, m2 = self.stats[agent, metric]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(m2 / (count - 1))
+
+    def interval(self, agent, metric, z=1.96):
+        '''Return lower and upper normal confidence bounds on the mean, 95% by default.'''
+        mean = self.mean(agent, metric)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            err = z * self.std(agent, metric) / np.sqrt(self.count(agent, metric))
+        return mean - err, mean + err
+
+    def save(self, path):
+        '''Write summary with one row per (agent, metric, iteration).'''
+        rows = [(agent, metric, i) for agent, metric in self.stats for i in range(len(self.count(agent, metric)))]
+        column = lambda f: np.concatenate([np.zeros([0]), *[f(*key) for key in self.stats]])
+        with open(path, 'wb') as f:
+            np.savez(f,
+                agent=np.array([row[0] for row in rows], dtype=str),
+                metric=np.array([row[1] for row in rows], dtype=str),
+                iteration=np.array([row[2] for row in rows], dtype=np.int32),
+                count=column(self.count).astype(np.int64),
+                mean=column(self.mean),
+                std=column(self.std))
+
+
+def aggregate(dirs, agents=None, metrics=None):
+    '''Return Aggregate of the runs in the experiment directories dirs, reading
+    only the shards of the given agents and metrics if provided.
+    '''
+    return Aggregate().update(shards(*dirs), agents, metrics)
@@ -0,0 +1,92 @@
+import multiprocessing
+import time
+import ast
+import os
+import torch
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+# threads each run can use productively, by agent factory: exact GPs are dominated by
+# dense linear algebra, clustering agents by KMeans, and the rest by small CNNs
+THREADS = dict(GaussianAgent=4, FixedGaussianAgent=4, SmartGaussianAgent=4, FittedGaussianAgent=4,
+               ThompsonGPAgent=4, SparseGaussianAgent=2, SmartSparseGaussianAgent=2,
+               BucketAgent=2, CombinatorialAgent=2, MarkerAgent=2, SeparationAgent=2)
+
+
+def limit(threads):
+    '''Limit torch, BLAS and OpenMP thread pools in this process to threads.'''
+    torch.set_num_threads(threads)
+    for var in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']:
+        os.environ[var] = str(threads) # for libraries loaded later
+    if threadpoolctl is not None:
+        threadpoolctl.threadpool_limits(limits=threads)
+
+
+def heuristic(agents):
+    '''Return threads per run for the agent specs, the most any of them uses.'''
+    names = [ast.parse(agent, mode='eval').body for agent in agents]
+    return max(THREADS.get(getattr(getattr(x, 'func', x), 'id', None), 1) for x in names)
+
+
+_job = None # run timed by calibration workers
+
+def _timed(threads):
+    limit(threads)
+    start = time.time()
+    _job()
+    return time.time() - start
+
+
+def calibrate(run, cpus, candidates=(1, 2, 4, 8)):
+    '''Return threads per run maximizing throughput on cpus cores, timing run
+    (a function of no arguments) once in a fresh forked process with each
+    candidate thread count. Throughput is estimated as (cpus // threads) / time.
+    '''
+    global _job
+    _job = run
+    rates = {}
+    for threads in candidates:
+        if threads > cpus:
+            break
+        with multiprocessing.get_context('fork').Pool(1) as pool:
+            rates[threads] = (cpus // threads) / pool.apply(_timed, (threads,))
+    return max(rates, key=rates.get)
+
+
+class Partition:
+    '''Split of a core budget between worker processes, each running with a
+    fixed number of threads. With affinity, each run is pinned to its own
+    block of cores for its duration.
+    '''
+
+    def __init__(self, cpus, threads, tasks, affinity=False):
+        '''cpus: number of cores to use
+        threads: threads per run
+        tasks: number of runs, bounding the number of processes
+        affinity: pin runs to disjoint blocks of cores
+        '''
+        self.threads = max(1, min(threads, cpus))
+        self.processes = max(1, min(tasks, cpus // self.threads))
+        self.cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        self.slots = None
+        if affinity and len(self.cores) >= self.processes * self.threads:
+            self.slots = multiprocessing.get_context('fork').Queue()
+            for slot in range(self.processes):
+                self.slots.put(slot)
+
+    def initializer(self):
+        '''Pool initializer limiting each worker's thread pools.'''
+        limit(self.threads)
+
+    def __enter__(self):
+        if self.slots is not None:
+            self.slot = self.slots.get()
+            os.sched_setaffinity(0, self.cores[self.slot * self.threads : (self.slot + 1) * self.threads])
+        return self
+
+    def __exit__(self, *args):
+        if self.slots is not None:
+            os.sched_setaffinity(0, self.cores)
+            self.slots.put(self.slot)
@@ -0,0 +1,126 @@
+from collections import defaultdict
+import contextlib
+import cProfile
+import json
+import threading
+import time
+import torch
+
+config = dict(events=False, profile=None, profiler='cprofile')
+phases = defaultdict(float) # seconds spent in each phase during the current iteration
+last = {} # phase times of the previous iteration
+_depth = defaultdict(int) # open instances of each phase
+_iteration = 0
+_events = None # open JSONL event log
+_local = threading.local() # per-thread flag set by untimed
+
+
+def configure(events=False, profile=None, profiler='cprofile'):
+    '''Set options for runs started afterwards.
+    events: write a JSONL log of every timed phase in each run
+    profile: iteration to profile, or None
+    profiler: 'cprofile' or 'torch'
+    '''
+    config.update(events=events, profile=profile, profiler=profiler)
+
+
+class phase(contextlib.ContextDecorator):
+    '''Context manager and decorator adding the time spent in it to phases[name],
+    and logging it as an event if the run has an event log. Phases are timed
+    inclusively, so nested phases also count towards enclosing ones, but only
+    the outermost of nested instances of the same phase is counted. Phases on
+    threads inside untimed are not timed.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.starts = []
+
+    def __enter__(self):
+        if getattr(_local, 'untimed', False):
+            return self
+        _depth[self.name] += 1
+        self.starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        if getattr(_local, 'untimed', False):
+            return False
+        elapsed = time.perf_counter() - self.starts.pop()
+        _depth[self.name] -= 1
+        if _depth[self.name]:
+            return False
+        phases[self.name] += elapsed
+        if _events is not None:
+            _events.write(json.dumps(dict(iteration=_iteration, phase=self.name, end=time.time(), duration=elapsed)) + '\n')
+        return False
+
+
+@contextlib.contextmanager
+def untimed():
+    '''Context in which phases on the current thread are not timed, for helper
+    threads whose work overlaps the phases timed on the main one.
+    '''
+    _local.untimed = True
+    try:
+        yield
+    finally:
+        _local.untimed = False
+
+
+def start(events=None, iteration=0):
+    '''Reset phase times for a run starting at iteration, logging events to the
+    file events if given.
+    '''
+    global _events, _iteration
+    stop()
+    phases.clear()
+    last.clear()
+    _depth.clear()
+    _iteration = iteration
+    if events is not None:
+        _events = open(events, 'a')
+
+
+def lap():
+    '''End the current iteration, returning its phase times.'''
+    global _iteration
+    last.clear()
+    last.update(phases)
+    phases.clear()
+    _iteration += 1
+    if _events is not None:
+        _events.flush()
+    return dict(last)
+
+
+def stop():
+    '''Close the event log of the current run.'''
+    global _events
+    if _events is not None:
+        _events.close()
+        _events = None
+
+
+@contextlib.contextmanager
+def profile(iteration, path):
+    '''Profile the enclosed code if iteration is the configured one, writing
+    cProfile stats to {path}.prof or a torch profiler trace to {path}.trace.json.
+    '''
+    if iteration != config['profile']:
+        yield
+    elif config['profiler'] == 'torch':
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(activities=activities, record_shapes=True) as prof:
+            yield
+        prof.export_chrome_trace(f'{path}.trace.json')
+    else:
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(f'{path}.prof')